@@ -0,0 +1,287 @@
+"""
+archive.py
+https://github.com/Zalgar/xrit-rx-docker
+
+SQLite catalogue of saved image products, queried by the dashboard archive API
+"""
+
+import calendar
+from colorama import Fore, Style
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DB_NAME = "archive.db"          # Catalogue file name (in demuxer output folder)
+PAGE_SIZE = 100                 # Images per page when no limit is requested
+MAX_PAGE_SIZE = 1000            # Largest page that can be requested
+
+# Observation date and time in product file names (e.g. IMG_FD_047_IR105_20190722_075006.jpg)
+TIME_PATTERN = re.compile(r"_(\d{8})_(\d{6})")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT NOT NULL UNIQUE,
+    type     TEXT NOT NULL,
+    channel  TEXT,
+    time     INTEGER NOT NULL,
+    size     INTEGER,
+    hash     TEXT,
+    segments INTEGER,
+    total    INTEGER,
+    added    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_time ON images (time, id);
+CREATE INDEX IF NOT EXISTS images_type_time ON images (type, time, id);
+CREATE INDEX IF NOT EXISTS images_channel_time ON images (channel, time, id);
+"""
+
+# Image file extensions indexed when scanning existing output
+IMAGE_EXTS = (".jpg", ".png", ".webp", ".tif", ".gif")
+XRIT_EXTS = (".lrit", ".hrit")
+
+WARM_START_DAYS = 2             # Newest date folders scanned for latest images when there is no catalogue
+
+
+def parse_name(path):
+    """
+    Get image type, channel and observation time (UTC seconds) from a product file name
+
+    Returns:
+        tuple -- (type, channel, time), or None if the name is not a product file name
+    """
+
+    name = os.path.basename(path)
+    parts = name.split('_')
+    match = TIME_PATTERN.search(name)
+    if len(parts) < 2 or parts[0] not in ('IMG', 'FDIMG', 'ADD') or match is None:
+        return None
+
+    try:
+        obs = calendar.timegm(time.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M%S"))
+    except ValueError:
+        return None
+
+    # Expected formats: IMG_[TYPE]_[SEQ]_[CHANNEL]_[DATE]_[TIME], ADD_[TYPE]_[SEQ]_[DATE]_[TIME]
+    channel = parts[3] if parts[0] != 'ADD' and len(parts) >= 6 else None
+    return parts[1], channel, obs
+
+
+def scan_latest(output, days=WARM_START_DAYS):
+    """
+    Find newest image of each type and newest xRIT file in the most recent date folders of the output path
+
+    Returns:
+        dict -- Image path by type
+        string -- xRIT file path (None if none were found)
+    """
+
+    try:
+        dates = sorted((d for d in os.listdir(output) if len(d) == 8 and d.isdigit()), reverse=True)[:days]
+    except OSError:
+        return {}, None
+    
+    images = {}     # (observation time, path) by type
+    xrit = None     # (observation time, path)
+    for date in dates:
+        for mode in os.scandir(os.path.join(output, date)):
+            if not mode.is_dir():
+                continue
+
+            for entry in os.scandir(mode.path):
+                name = entry.name.lower()
+                info = parse_name(entry.name)
+                if info is None or "_partial" in name:
+                    continue
+
+                if name.endswith(XRIT_EXTS):
+                    if xrit is None or info[2] > xrit[0]:
+                        xrit = (info[2], entry.path)
+                elif name.endswith(IMAGE_EXTS):
+                    if info[0] not in images or info[2] > images[info[0]][0]:
+                        images[info[0]] = (info[2], entry.path)
+    
+    return {t: path for t, (_, path) in images.items()}, (xrit[1] if xrit else None)
+
+
+class Archive:
+    """
+    Catalogue of saved image products.
+    The demuxer adds images as products are saved, dashboard threads query with their own connections.
+    """
+
+    def __init__(self, output):
+        self.path = os.path.abspath(os.path.join(output, DB_NAME))
+        self.local = threading.local()      # Connection per thread (SQLite connections can not be shared)
+
+        os.makedirs(output, exist_ok=True)
+        new = not os.path.isfile(self.path)
+        db = self.connect()
+        db.execute("PRAGMA journal_mode=WAL")   # Readers do not block the demuxer while it adds images
+        db.executescript(SCHEMA)
+        db.commit()
+
+        # Index images saved before the catalogue existed
+        if new:
+            scan = threading.Thread(target=self.scan, args=(output,), name="ARCHIVE SCAN", daemon=True)
+            scan.start()
+
+    def connect(self):
+        """
+        Get SQLite connection of calling thread
+        """
+
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.row_factory = sqlite3.Row
+            self.local.db = db
+        return db
+
+    def add(self, path, hash=None, segments=None, total=None):
+        """
+        Add saved image to catalogue (replaces existing entry for the same path)
+
+        Arguments:
+            path {string} -- Image path
+            hash {string} -- SHA-256 of image file
+            segments {int} -- Segments received
+            total {int} -- Segments expected
+        """
+
+        info = parse_name(path)
+        if info is None:
+            return
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+
+        db = self.connect()
+        db.execute(
+            "INSERT OR REPLACE INTO images (path, type, channel, time, size, hash, segments, total, added) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, *info, size, hash, segments, total, time.time())
+        )
+        db.commit()
+
+    def add_product(self, product, hash=None):
+        """
+        Add every file written by a saved product to catalogue
+
+        Arguments:
+            product {Product} -- Saved product (files listed in product.saved)
+            hash {string} -- SHA-256 of primary output (product.last)
+        """
+
+        for path in product.saved:
+            self.add(path, hash if path == product.last else None, product.counter, product.total)
+
+    def scan(self, output):
+        """
+        Add every product image in the output folder to the catalogue (hashes are not computed)
+        """
+
+        rows = []
+        for root, dirs, files in os.walk(output):
+            # Reduced resolution levels and checkpoint spool are not products
+            dirs[:] = [d for d in dirs if d != "pyramid" and not d.startswith(".")]
+
+            for name in files:
+                if not name.lower().endswith(IMAGE_EXTS) or "_partial" in name:
+                    continue
+
+                path = os.path.join(root, name)
+                info = parse_name(path)
+                if info is None:
+                    continue
+
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    continue
+                rows.append((path, *info, size, time.time()))
+
+        db = self.connect()
+        db.executemany("INSERT OR IGNORE INTO images (path, type, channel, time, size, added) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        db.commit()
+        print(Fore.GREEN + Style.BRIGHT + "ARCHIVE CATALOGUE: INDEXED {} EXISTING IMAGES".format(len(rows)))
+
+    def query(self, image_type=None, channel=None, start=None, end=None, limit=PAGE_SIZE, cursor=None):
+        """
+        List images newest first
+
+        Arguments:
+            image_type {string} -- Image type (e.g. FD)
+            channel {string} -- Channel (e.g. IR105)
+            start {int} -- Earliest observation time (UTC seconds, inclusive)
+            end {int} -- Latest observation time (UTC seconds, inclusive)
+            limit {int} -- Images per page
+            cursor {tuple} -- (time, id) of last image on previous page
+
+        Returns:
+            list -- Image rows
+            int -- Number of images matching filters (first page only, None when a cursor is given)
+            tuple -- Cursor of next page (None on last page)
+        """
+
+        where = []
+        params = []
+        if image_type is not None:
+            where.append("type = ?")
+            params.append(image_type)
+        if channel is not None:
+            where.append("channel = ?")
+            params.append(channel)
+        if start is not None:
+            where.append("time >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("time <= ?")
+            params.append(end)
+        filters = " WHERE " + " AND ".join(where) if where else ""
+
+        # Count matching images once per query, later pages only follow the cursor
+        db = self.connect()
+        total = db.execute("SELECT COUNT(*) FROM images" + filters, params).fetchone()[0] if cursor is None else None
+
+        # Keyset pagination stays fast at any depth (no OFFSET scan)
+        if cursor is not None:
+            where.append("(time < ? OR (time = ? AND id < ?))")
+            params += [cursor[0], cursor[0], cursor[1]]
+        filters = " WHERE " + " AND ".join(where) if where else ""
+
+        rows = db.execute("SELECT * FROM images" + filters + " ORDER BY time DESC, id DESC LIMIT ?", params + [limit]).fetchall()
+        next_cursor = (rows[-1]['time'], rows[-1]['id']) if len(rows) == limit else None
+
+        return [dict(r) for r in rows], total, next_cursor
+
+    def latest(self):
+        """
+        Newest image of each type, skipping images that have since been deleted
+
+        Returns:
+            dict -- Image row by type
+        """
+
+        db = self.connect()
+        latest = {}
+        for (image_type,) in db.execute("SELECT DISTINCT type FROM images").fetchall():
+            for row in db.execute("SELECT * FROM images WHERE type = ? ORDER BY time DESC, id DESC LIMIT 10", (image_type,)):
+                if os.path.isfile(row['path']):
+                    latest[image_type] = dict(row)
+                    break
+        
+        return latest
+
+    def close(self):
+        """
+        Close SQLite connection of calling thread
+        """
+
+        db = getattr(self.local, 'db', None)
+        if db is not None:
+            db.close()
+            self.local.db = None
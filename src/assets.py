@@ -0,0 +1,124 @@
+"""
+assets.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Dashboard static files held in memory, pre-compressed, with content hashed URLs
+"""
+
+from collections import namedtuple
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from threading import Lock
+import time
+
+try:
+    import brotli               # Optional, gzip is used when not installed
+except ImportError:
+    brotli = None
+
+
+# Static file held in memory (compressed bodies are None when compression does not help)
+Asset = namedtuple("Asset", "mime etag mtime identity gzip brotli")
+
+COMPRESS_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+COMPRESS_MIN_SIZE = 256         # Smaller files are sent uncompressed
+CHECK_INTERVAL = 2              # Seconds between checks for changed files on disk
+
+# Local stylesheet and script references in HTML pages (rewritten to content hashed URLs)
+REFERENCE = re.compile(r'((?:href|src)=")([^":?#]+\.(?:css|js))(")')
+
+
+class Assets:
+    """
+    Static files of the dashboard, loaded and compressed once and reloaded when they change on disk
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}            # Asset by path relative to root (using / separators)
+        self.checked = 0            # Time files were last checked for changes
+        self.lock = Lock()
+        self.refresh()
+
+    def get(self, path):
+        """
+        Get asset by path relative to root (None if it is not a static file)
+        """
+
+        if time.time() - self.checked > CHECK_INTERVAL:
+            with self.lock:
+                if time.time() - self.checked > CHECK_INTERVAL:
+                    self.refresh()
+
+        return self.assets.get(path)
+
+    def refresh(self):
+        """
+        Load new and changed files (pages are loaded last so they reference current content hashes)
+        """
+
+        self.checked = time.time()
+        files = {}
+        for folder, _, names in os.walk(self.root):
+            for name in names:
+                full = os.path.join(folder, name)
+                try:
+                    files[os.path.relpath(full, self.root).replace(os.sep, "/")] = os.stat(full).st_mtime_ns
+                except OSError:
+                    continue
+
+        changed = [p for p, mtime in files.items() if p not in self.assets or self.assets[p].mtime != mtime]
+        if not changed and len(files) == len(self.assets):
+            return
+
+        # Pages are reloaded when any file they could reference has changed
+        pages = [p for p in files if p.endswith(".html")]
+        reload = [p for p in changed if p not in pages]
+        reload += [p for p in pages if p in changed or reload]
+
+        assets = {p: a for p, a in self.assets.items() if p in files}
+        for path in reload:
+            try:
+                assets[path] = self.load(path, files[path], assets)
+            except OSError:
+                assets.pop(path, None)
+
+        self.assets = assets
+
+    def load(self, path, mtime, assets):
+        """
+        Read and compress a file
+        """
+
+        with open(os.path.join(self.root, path), "rb") as f:
+            body = f.read()
+
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if mime == "text/html":
+            body = REFERENCE.sub(lambda m: self.versioned(m, path, assets), body.decode("utf-8")).encode("utf-8")
+        if mime.startswith("text/") or mime == "application/javascript":
+            mime += "; charset=utf-8"
+
+        gz = br = None
+        if mime.startswith(COMPRESS_TYPES) and len(body) >= COMPRESS_MIN_SIZE:
+            gz = gzip.compress(body, compresslevel=9, mtime=0)
+            gz = gz if len(gz) < len(body) else None
+            if brotli is not None:
+                br = brotli.compress(body, quality=11)
+                br = br if len(br) < len(body) else None
+
+        return Asset(mime, hashlib.sha256(body).hexdigest()[:16], mtime, body, gz, br)
+
+    def versioned(self, match, page, assets):
+        """
+        Add content hash to a stylesheet or script URL so it can be cached indefinitely
+        """
+
+        target = os.path.normpath(os.path.join(os.path.dirname(page), match.group(2))).replace(os.sep, "/")
+        if target not in assets:
+            return match.group(0)
+
+        return "{}{}?v={}{}".format(match.group(1), match.group(2), assets[target].etag, match.group(3))
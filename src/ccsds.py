@@ -20,6 +20,8 @@ class VCDU:
     def __init__(self, data):
         self.data = data
         self.tools = Tools()
+        self.received = None            # When VCDU was received (wall clock, set by demuxer)
+        self.dequeued = None            # When VCDU left the demuxer receive queue (wall clock, set by demuxer)
         self.parse()
     
     def parse(self):
@@ -131,6 +133,7 @@ class CP_PDU:
         self.PARSED = False
         self.PAYLOAD = None
         self.Sequence = Enum('Sequence', 'CONTINUE FIRST LAST SINGLE')
+        self.received = None            # When first VCDU of CP_PDU was received (set by channel handler)
 
         # Parse header once enough data is present
         if len(data) >= 6:
@@ -289,6 +292,7 @@ class TP_File:
         self.data = data
         self.tools = Tools()
         self.PAYLOAD = None
+        self.received = None            # When first VCDU of TP_File was received (set by channel handler)
         self.parse()
     
     def parse(self):
@@ -369,6 +373,7 @@ class S_PDU:
         self.tools = Tools()
         self.keys = k
         self.key = None
+        self.index = None
         self.headerField = None
         self.dataField = None
         self.PLAINTEXT = None
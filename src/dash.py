@@ -9,27 +9,254 @@ Original work by sam210723: https://github.com/sam210723/xrit-rx
 """
 
 from colorama import Fore, Back, Style
-from datetime import datetime
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import email.utils
+import gzip
+import hashlib
 import http.server
+import io
 import json
 import logging
 import mimetypes
 import os
-import socketserver
+import pathlib
+import queue
+import re
 import subprocess
-from threading import Thread
+from threading import Lock, Thread
 import time
+import urllib.parse
+
+import archive
+import assets
+from demuxer import EVENT_ROUTES
+import metrics
+import products
+import profiler
+import ratelimit
+import resize
+import tracing
 
 dash_config = None
 demuxer_instance = None
+resize_cache = None
+static_assets = None
+rate_limiter = None
+api_routes = None
+
+KEEPALIVE_TIMEOUT = 15      # Seconds an idle keep-alive connection holds a worker thread
+KEEPALIVE_BUSY_TIMEOUT = 1  # Seconds an idle keep-alive connection holds a worker thread while other connections wait for one
+GZIP_MIN_SIZE = 1024        # Smallest JSON response compressed with gzip (bytes)
+GZIP_CACHE_SIZE = 64        # Compressed JSON responses kept by ETag
+
+# Cache-Control policies by route
+CACHE_REVALIDATE = "no-cache"               # Demuxer state, latest images and static files (revalidated with ETag)
+CACHE_RECEIVED = "public, max-age=86400"    # Received files requested by path (not changed once saved)
+CACHE_NONE = "no-store"                     # Errors
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"  # Static files requested by content hashed URL
+
+# Prefix of demuxer state ETags, so versions from a previous run never match
+epoch = "{:x}".format(int(time.time()))
+
+EVENT_HEARTBEAT = 15        # Seconds between keep-alive comments on idle event streams
+
+event_clients = 0           # Number of connected event stream clients
+event_lock = Lock()         # Guards event client count
+
+gzip_cache = OrderedDict()  # Compressed JSON responses by ETag, least recently used first
+gzip_lock = Lock()
+state_header_cache = None   # (snapshot version, ETag, Last-Modified) of latest demuxer state
+
+# Valid API path component (letters, digits, dot, dash and underscore)
+PATH_COMPONENT = re.compile(r"[a-zA-Z0-9._-]{1,100}")
+
+# Special keys of API route table nodes (path components can not match them)
+ROUTE_END = ""              # Handler of the path ending at this node
+ROUTE_ANY = "*"             # Node matching any path segment without its own node
+ROUTE_REST = "**"           # Handler of longer paths with no matching node (e.g. files in a folder)
+
+# Parsed API request passed to route handlers
+ApiRequest = namedtuple('ApiRequest', 'segments rest query width fmt snapshot')
+
+# Response built once when the dashboard starts (JSON bytes and ETag)
+StaticRoute = namedtuple('StaticRoute', 'content etag')
+
+# Content of /api/docs (serialised once when the dashboard starts)
+API_DOCS = {
+    'endpoints': {
+        '/api': 'System configuration and status information',
+        '/api/docs': 'This API documentation',
+        '/api/current/vcid': 'Currently processing Virtual Channel ID',
+        '/api/current/progress': 'Current download progress for active products',
+        '/api/events': 'Server-sent event stream of demuxer updates (vcid, image, xrit, progress, partial, timelapse)',
+        '/api/latest/image': 'Metadata for the most recent image of any type',
+        '/api/latest/{type}': 'Metadata for the most recent image of specific type',
+        '/api/latest/{type}/image': 'Actual image file for the most recent image of specific type',
+        '/api/latest/{type}/image?w={width}': 'Smallest saved resolution level of the most recent image at least {width} pixels wide (resized to {width} if no level was saved)',
+        '/api/latest/{type}/image?w={width}&fmt={format}': 'Most recent image resized to {width} pixels wide as jpeg, webp or png (cached)',
+        '/api/latest/{type}/partial': 'Partial/preview image for actively downloading products',
+        '/api/latest/{type}/partial?w={width}': 'Partial image reduced while decoding to at least {width} pixels wide',
+        '/api/latest/xrit': 'Metadata for the most recent xRIT file',
+        '/api/cache': 'Resized image cache hit/miss counters and size',
+        '/api/limits': 'Rate limits, allowed/limited request counters by route class and most limited clients',
+        '/api/profile': 'State of the running sampling profile and the last finished profile (POST with ?duration={seconds}&format={collapsed|speedscope} starts a profile when enabled)',
+        '/api/profile/latest': 'Last finished profile file',
+        '/api/traces?type={type}&limit={n}': 'Stage timestamps and durations of the latest saved products newest first, from first VCDU to file written',
+        '/metrics': 'Demuxer, product and dashboard metrics in Prometheus text format',
+        '/api/archive?type={type}&channel={channel}&start={time}&end={time}&limit={n}&cursor={cursor}': 'Saved images newest first, filtered by type, channel and observation time (ISO 8601 or UTC seconds), paginated with the returned cursor'
+    },
+    'image_types': {
+        'FD': {
+            'name': 'Full Disk',
+            'description': 'Full disk imagery covering the entire Earth hemisphere',
+            'typical_size': 'Large (multiple MB)',
+            'format': 'PNG/JPEG'
+        },
+        'SICEF24': {
+            'name': 'Sea Ice and Cloud Edge Forecast',
+            'description': 'Sea Ice and Cloud Edge Forecast (24-hour)',
+            'typical_size': 'Medium (1-2 MB)',
+            'format': 'PNG/JPEG'
+        },
+        'ADD': {
+            'name': 'Additional Data',
+            'description': 'Additional data products and supplementary imagery',
+            'typical_size': 'Variable',
+            'format': 'Various formats'
+        }
+    },
+    'response_formats': {
+        'metadata_endpoints': 'JSON with image path, hash, and type information',
+        'image_endpoints': 'Raw image data with appropriate MIME type',
+        'error_responses': 'JSON with error message when resource not found'
+    },
+    'example_usage': {
+        'get_latest_fd_metadata': '/api/latest/fd',
+        'get_latest_fd_image': '/api/latest/fd/image',
+        'get_system_info': '/api',
+        'get_current_vcid': '/api/current/vcid',
+        'list_timelapses': '/api/timelapses',
+        'get_timelapse_file': '/api/timelapses/{filename}'
+    }
+}
+
+
+def static_route(content):
+    """
+    Serialise a response that does not change while xrit-rx is running
+    """
+
+    content = json.dumps(content, sort_keys=False).encode('utf-8')
+    return StaticRoute(content, '"{}"'.format(hashlib.sha1(content).hexdigest()))
+
+
+def build_routes(config):
+    """
+    Build API route table, a tree of nodes by path segment with handler functions (or static responses) as leaves
+    """
+
+    routes = {
+        ROUTE_END: static_route({
+            'version': config.version,
+            'spacecraft': config.spacecraft,
+            'downlink': config.downlink,
+            'vcid_blacklist': config.blacklist,
+            'output_path': config.output,
+            'images': config.images,
+            'xrit': config.xrit,
+            'interval': int(config.interval)
+        }),
+        'docs':     {ROUTE_END: static_route(API_DOCS)},
+        'archive':  {ROUTE_END: Handler.api_archive},
+        'cache':    {ROUTE_END: Handler.api_cache},
+        'limits':   {ROUTE_END: Handler.api_limits},
+        'traces':   {ROUTE_END: Handler.api_traces},
+        'profile': {
+            ROUTE_END:  Handler.api_profile,
+            'latest':   {ROUTE_END: Handler.api_profile_latest}
+        },
+        'current': {
+            'vcid':     {ROUTE_END: Handler.api_state},
+            'progress': {ROUTE_END: Handler.api_state},
+            'partial':  {ROUTE_END: Handler.api_state}
+        },
+        'latest': {
+            'image':    {ROUTE_END: Handler.api_state},
+            'xrit':     {ROUTE_END: Handler.api_state},
+            ROUTE_ANY: {
+                ROUTE_END:  Handler.api_latest_type,
+                'image':    {ROUTE_END: Handler.api_latest_image},
+                'partial':  {ROUTE_END: Handler.api_latest_partial}
+            }
+        },
+        'timelapse':    {'list': {ROUTE_END: Handler.api_timelapses}},
+        'timelapses':   {ROUTE_END: Handler.api_timelapses, ROUTE_REST: Handler.api_timelapse_file}
+    }
+
+    # Received files are requested by their path, starting with the demuxer output root path
+    node = routes
+    for segment in config.output.split("/"):
+        if segment:
+            node = node.setdefault(segment, {})
+    node[ROUTE_REST] = Handler.api_file
+
+    return routes
+
+
+def file_url(path):
+    """
+    API URL of a received file (None if the file is not under the demuxer output path)
+    """
+
+    # Output path may be absolute or relative, the file route starts with its non-empty components
+    rel = os.path.relpath(path, dash_config.output)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        return None
+    return "/api/" + "/".join([s for s in dash_config.output.split("/") if s] + rel.split(os.sep))
+
+
+def list_timelapses():
+    """
+    List available timelapse files
+    """
+    # Get absolute path to timelapses directory
+    output_dir = os.path.abspath(dash_config.output)
+    timelapses_dir = os.path.join(os.path.dirname(output_dir), "timelapses")
+    if not os.path.exists(timelapses_dir):
+        return {'timelapses': []}
+
+    timelapses = []
+    for filename in os.listdir(timelapses_dir):
+        if filename.endswith(('.mp4', '.gif')):
+            filepath = os.path.join(timelapses_dir, filename)
+            stat = os.stat(filepath)
+            timelapses.append({
+                'filename': filename,
+                'size': stat.st_size,
+                'created': stat.st_mtime,
+                'url': f'/api/timelapses/{filename}'
+            })
+
+    return {'timelapses': sorted(timelapses, key=lambda x: x['created'], reverse=True)}
+
 
 class Dashboard:
     def __init__(self, config, demuxer):
         global dash_config
         global demuxer_instance
+        global resize_cache
+        global static_assets
+        global rate_limiter
+        global api_routes
 
         dash_config = config
         demuxer_instance = demuxer
+        resize_cache = resize.ResizeCache(dash_config.resize_cache)
+        static_assets = assets.Assets("html")
+        rate_limiter = ratelimit.RateLimiter(dash_config.rate_limits)
+        api_routes = build_routes(dash_config)
 
         self.socket = None
         max_retries = 10  # Maximum number of retry attempts
@@ -37,7 +264,7 @@ class Dashboard:
         
         for attempt in range(max_retries):
             try:
-                self.socket = socketserver.TCPServer(("", int(dash_config.port)), Handler)
+                self.socket = Server(("", int(dash_config.port)), Handler, dash_config.threads, dash_config.connections)
                 print(Fore.GREEN + Style.BRIGHT + "DASHBOARD STARTED ON PORT {}".format(dash_config.port))
                 break  # Success, exit the retry loop
             except OSError as e:
@@ -60,6 +287,17 @@ class Dashboard:
         if self.socket is None:
             return
 
+        # Dashboard state read when metrics are requested
+        server = self.socket
+        metrics.Gauge("xrit_http_connections", "Open dashboard connections (served or waiting for a worker)", collect=lambda: server.connections)
+        metrics.Counter("xrit_http_rejected_connections_total", "Dashboard connections refused over max_connections", collect=lambda: server.rejected)
+        metrics.Gauge("xrit_event_clients", "Connected dashboard event stream clients", collect=lambda: event_clients)
+        metrics.Counter("xrit_rate_limited_requests_total", "Dashboard requests refused by rate limits", ("route",), collect=lambda: {(c,): n for c, n in rate_limiter.limited.items()})
+        metrics.Counter("xrit_resize_cache_hits_total", "Resized image requests served from cache", collect=lambda: resize_cache.hits)
+        metrics.Counter("xrit_resize_cache_misses_total", "Resized image requests that needed a resize", collect=lambda: resize_cache.misses)
+        metrics.Counter("xrit_resize_cache_deferred_total", "Resized image requests served the saved image while the resize was in progress", collect=lambda: resize_cache.deferred)
+        metrics.Gauge("xrit_resize_cache_bytes", "Size of resized images held in cache", collect=lambda: resize_cache.bytes)
+
         # Start HTTP server thread
         self.httpd_thread = Thread()
         self.httpd_thread.name = "HTTP SERVER"
@@ -75,23 +313,118 @@ class Dashboard:
         self.socket.serve_forever()
     
 
+    def publish_timelapses(self):
+        """
+        Push timelapse list to event stream clients (called when the timelapse service finishes a timelapse)
+        """
+
+        demuxer_instance.publish("timelapse", list_timelapses())
+
+
     def stop(self):
         """
         Stops the HTTP server thread
         """
 
         try:
+            demuxer_instance.close_subscribers()
             if self.socket is not None:
                 self.socket.shutdown()
+                self.socket.server_close()
+            resize_cache.stop()
         except AttributeError:
             return
 
 
+class Server(http.server.HTTPServer):
+    """
+    HTTP server handling each connection in a bounded pool of worker threads
+    """
+
+    request_queue_size = 128        # Listen backlog for bursts of new connections
+
+    def __init__(self, address, handler, workers, max_connections):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="HTTP WORKER")
+        self.workers = workers
+        self.max_connections = max_connections
+        self.connections = 0        # Open connections (served or waiting for a worker)
+        self.rejected = 0           # Connections refused because the limit was reached
+        self.lock = Lock()
+        self.closed = False         # Set on close so long-lived event streams end
+        super().__init__(address, handler)
+
+    def process_request(self, request, client_address):
+        """
+        Queue connection in worker pool (connections wait for a free worker once the pool is busy).
+        Connections over the limit are refused straight away rather than queued.
+        """
+
+        with self.lock:
+            if self.connections >= self.max_connections:
+                self.rejected += 1
+                full = True
+            else:
+                self.connections += 1
+                full = False
+        
+        if full:
+            try:
+                request.sendall(b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+
+        self.pool.submit(self.process_request_worker, request, client_address)
+
+    def process_request_worker(self, request, client_address):
+        """
+        Serve every request on a connection then close it
+        """
+
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self.lock:
+                self.connections -= 1
+
+    def busy(self):
+        """
+        Check if connections are waiting for a worker
+        """
+
+        return self.connections > self.workers
+
+    def server_close(self):
+        self.closed = True
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
 class Handler(http.server.SimpleHTTPRequestHandler):
     """
     Custom HTTP request handler
     """
 
+    protocol_version = "HTTP/1.1"   # Keep connections alive between requests (every response sets Content-Length)
+    timeout = KEEPALIVE_TIMEOUT     # Close idle connections so they release their worker
+    disable_nagle_algorithm = True  # Headers and body are written separately, avoid delayed ACK stalls on kept-alive connections
+
+    def handle(self):
+        """
+        Handle requests on a connection until it is closed or stays idle for the keep-alive timeout
+        """
+
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            # Idle connections give up their worker sooner while other connections wait for one
+            self.connection.settimeout(KEEPALIVE_BUSY_TIMEOUT if self.server.busy() else KEEPALIVE_TIMEOUT)
+            self.handle_one_request()
+
     def __init__(self, request, client_address, server):
         try:
             super().__init__(request, client_address, server)
@@ -103,106 +436,418 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         """
         Respond to GET requests
         """
+
+        self.respond(head=False)
+
+
+    def do_HEAD(self):
+        """
+        Respond to HEAD requests (same as GET but without body)
+        """
+
+        self.respond(head=True)
+
+
+    def do_POST(self):
+        """
+        Respond to POST requests (only /api/profile, which starts a sampling profile)
+        """
+
+        # Request body is not used
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        
+        logging.info(f"HTTP POST request from {self.client_address[0]}: {self.path}")
+        url = urllib.parse.urlsplit(self.path)
+        headers = {'Cache-Control': CACHE_NONE}
+        retry = rate_limiter.check(self.client_address[0], "metadata")
+        
+        if retry:
+            content, status = {'error': 'Too many requests', 'retry_after': retry}, 429
+            headers['Retry-After'] = str(retry)
+        elif url.path != "/api/profile":
+            content, status = {'error': 'Method not allowed'}, 405
+            headers['Allow'] = "GET, HEAD"
+        elif not dash_config.profiling:
+            content, status = {'error': 'Profiling from the dashboard is disabled'}, 403
+        else:
+            content, status = self.start_profile(urllib.parse.parse_qs(url.query))
+        
+        try:
+            self.send_content(status, "application/json", json.dumps(content).encode('utf-8'), False, headers)
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            self.close_connection = True
+        metrics.HTTP_REQUESTS.inc("metadata", str(status))
+
+
+    def respond(self, head):
+        """
+        Respond to GET and HEAD requests with API content or local files
+        """
         # Log the request for security monitoring
         client_ip = self.client_address[0]
+        method = "HEAD" if head else "GET"
         
         # Use different log levels: DEBUG for API requests, INFO for others
         if self.path.startswith("/api/") or self.path == "/api":
-            logging.debug(f"API request from {client_ip}: {self.path}")
+            logging.debug(f"API {method} request from {client_ip}: {self.path}")
         else:
-            logging.info(f"HTTP GET request from {client_ip}: {self.path}")
+            logging.info(f"HTTP {method} request from {client_ip}: {self.path}")
 
         # Respond with index.html content on root path requests
         if self.path == "/": self.path = "index.html"
+
+        route_class = self.route_class(self.path)
+        start = time.perf_counter()
+        self.status = None
         
         try:
-            if self.path.startswith("/api/") or self.path == "/api":    # API endpoint requests
-                content, status, mime = self.handle_api(self.path)
+            # Clients over their request budget for this kind of route are asked to retry later (HTTP 429)
+            retry = rate_limiter.check(client_ip, route_class)
+            if retry:
+                content = json.dumps({'error': 'Too many requests', 'retry_after': retry}).encode('utf-8')
+                self.send_content(429, "application/json", content, head, {'Cache-Control': CACHE_NONE, 'Retry-After': str(retry)})
+                return
 
-                self.send_response(status)
-                self.send_header('Content-type', mime)
-                self.end_headers()
-                self.wfile.write(content)
+            if self.path == "/api/events" and not head:                 # Event stream
+                self.send_events()
+            elif self.path.startswith("/api/") or self.path == "/api":  # API endpoint requests
+                content, status, mime, headers = self.handle_api(self.path)
+
+                if isinstance(content, pathlib.Path):
+                    self.send_file(content, mime, head, headers)
+                else:
+                    self.send_content(status, mime, content, head, headers)
+            elif self.path == "/metrics":                               # Prometheus metrics
+                self.send_content(200, metrics.CONTENT_TYPE, metrics.render(), head, {'Cache-Control': CACHE_NONE})
             else:                                                       # Local file requests
-                self.path = "html/{}".format(self.path)
+                url = urllib.parse.urlsplit(self.path)
+                requested_path = url.path.lstrip('/')
+                asset = static_assets.get(requested_path)
 
-                if os.path.isfile(self.path):                           # Requested file exists (HTTP 200)
-                    self.send_response(200)
-                    mime = mimetypes.guess_type(self.path)[0]
-                    self.send_header('Content-type', mime)
-                    self.end_headers()
+                # Sanitize and validate file path
+                safe_path = self.sanitize_file_path(requested_path) if asset is None else None
 
-                    self.wfile.write(
-                        open(self.path, 'rb').read()
-                    )
+                if asset is not None:                                   # Static file held in memory
+                    self.send_asset(asset, head, urllib.parse.parse_qs(url.query).get('v') == [asset.etag])
+                elif safe_path is None:                                 # Path outside html directory (HTTP 403)
+                    self.send_content(403, None, b'', head)
+                elif os.path.isfile(safe_path):                         # Requested file exists (HTTP 200)
+                    self.send_file(pathlib.Path(safe_path), mimetypes.guess_type(safe_path)[0], head, {'Cache-Control': CACHE_REVALIDATE})
                 else:                                                   # Requested file not found (HTTP 404)
-                    self.send_response(404)
-                    self.end_headers()
+                    self.send_content(404, None, b'', head)
         except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
             # Client disconnected, nothing we can do
+            self.close_connection = True
             return
         except Exception as e:
-            # Log other exceptions but don't crash
-            print(f"HTTP Server Error: {e}")
+            # Log other exceptions but don't crash (response may be incomplete so drop connection)
+            print(f"HTTP {method} Server Error: {e}")
+            self.close_connection = True
             return
-    
+        finally:
+            # Event streams stay open until the client disconnects, so they are not timed
+            if self.path != "/api/events":
+                label = route_class or ("metrics" if self.path == "/metrics" else "static")
+                metrics.HTTP_REQUESTS.inc(label, str(self.status or "error"))
+                metrics.HTTP_LATENCY.observe(time.perf_counter() - start, label)
 
-    def do_HEAD(self):
+
+    def route_class(self, path):
         """
-        Respond to HEAD requests (same as GET but without body)
+        Get rate limit class of a request path (None for static files, which are not limited)
         """
-        # Log the request for security monitoring
-        client_ip = self.client_address[0]
+
+        if not (path.startswith("/api/") or path == "/api"):
+            return None
+
+        path = urllib.parse.urlsplit(path).path.split("/")[2:]
+        if path and path[0] in ("timelapse", "timelapses"):
+            return "timelapse"
+        elif not path or path[0] in ("docs", "events", "current", "archive", "cache", "limits", "traces", "profile"):
+            return "metadata"
+        elif path[0] == "latest" and len(path) < 3:
+            return "metadata"
         
-        # Use different log levels: DEBUG for API requests, INFO for others
-        if self.path.startswith("/api/") or self.path == "/api":
-            logging.debug(f"API HEAD request from {client_ip}: {self.path}")
+        # Latest image and partial files, and received files requested by path
+        return "image"
+
+
+    def send_events(self):
+        """
+        Stream demuxer events to client as server-sent events until it disconnects
+        """
+
+        global event_clients
+
+        # Each stream holds a worker thread, keep half of the pool for other requests
+        with event_lock:
+            if event_clients >= max(1, dash_config.threads // 2):
+                self.send_content(503, "application/json", json.dumps({'error': 'Too many event clients'}).encode('utf-8'), headers={'Retry-After': '10'})
+                return
+            event_clients += 1
+        
+        events = demuxer_instance.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header('Content-type', 'text/event-stream')
+            self.send_header('Cache-Control', CACHE_NONE)
+            self.end_headers()
+            self.close_connection = True    # Stream has no length, connection ends with it
+
+            # Current state so client needs no initial requests
+            self.wfile.write(b"retry: 3000\n\n")
+            for name, data in self.get_state():
+                self.wfile.write(b"event: %s\ndata: %s\n\n" % (name.encode('utf-8'), data))
+
+            while not self.server.closed:
+                try:
+                    message = events.get(timeout=EVENT_HEARTBEAT)
+                except queue.Empty:
+                    # Keep idle stream open and notice disconnected clients
+                    self.wfile.write(b": keep-alive\n\n")
+                    continue
+                
+                # Dashboard is stopping
+                if message is None:
+                    break
+                self.wfile.write(message)
+        finally:
+            demuxer_instance.unsubscribe(events)
+            with event_lock:
+                event_clients -= 1
+
+
+    def get_state(self):
+        """
+        Current demuxer state as (event name, serialised JSON) pairs
+        """
+
+        snapshot = demuxer_instance.snapshot
+        return [(event, snapshot.routes[route]) for event, route in EVENT_ROUTES.items()]
+
+
+    def send_asset(self, asset, head, versioned):
+        """
+        Send static file from memory in the smallest encoding accepted by the client
+        """
+
+        accepted = self.accepted_encodings()
+        if asset.brotli is not None and 'br' in accepted:
+            content, encoding = asset.brotli, 'br'
+        elif asset.gzip is not None and 'gzip' in accepted:
+            content, encoding = asset.gzip, 'gzip'
         else:
-            logging.info(f"HTTP HEAD request from {client_ip}: {self.path}")
+            content, encoding = asset.identity, None
+
+        # Each encoding is a different representation, so it needs its own strong ETag
+        headers = {
+            'ETag': '"{}{}"'.format(asset.etag, "-" + encoding if encoding else ""),
+            'Cache-Control': CACHE_IMMUTABLE if versioned else CACHE_REVALIDATE
+        }
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+        if asset.gzip is not None or asset.brotli is not None:
+            headers['Vary'] = 'Accept-Encoding'
         
-        # Respond with index.html content on root path requests
-        if self.path == "/": self.path = "index.html"
+        self.send_content(200, asset.mime, content, head, headers)
+
+
+    def compress(self, content, etag):
+        """
+        Gzip compress response, reusing the compressed copy of responses with the same ETag
+        """
+
+        if etag is None:
+            return gzip.compress(content, compresslevel=6)
         
-        try:
-            if self.path.startswith("/api/") or self.path == "/api":    # API endpoint requests
-                content, status, mime = self.handle_api(self.path)
-
-                self.send_response(status)
-                self.send_header('Content-type', mime)
-                self.send_header('Content-Length', str(len(content) if isinstance(content, bytes) else len(str(content).encode('utf-8'))))
-                self.end_headers()
-                # Don't send body for HEAD requests
-            else:                                                       # Local file requests
-                # Sanitize and validate file path
-                requested_path = self.path.lstrip('/')
-                safe_path = self.sanitize_file_path(requested_path)
-                if safe_path is None:
-                    self.send_response(403)
+        with gzip_lock:
+            compressed = gzip_cache.get(etag)
+            if compressed is not None:
+                gzip_cache.move_to_end(etag)
+                return compressed
+        
+        compressed = gzip.compress(content, compresslevel=6, mtime=0)
+        with gzip_lock:
+            gzip_cache[etag] = compressed
+            if len(gzip_cache) > GZIP_CACHE_SIZE:
+                gzip_cache.popitem(last=False)
+        
+        return compressed
+
+
+    def accepted_encodings(self):
+        """
+        Content codings accepted by client (Accept-Encoding without those refused with q=0)
+        """
+
+        accepted = set()
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.strip().partition(';')
+            try:
+                q = float(params.strip()[2:]) if params.strip().startswith('q=') else 1
+            except ValueError:
+                q = 1
+            if name and q > 0:
+                accepted.add(name.strip().lower())
+        
+        return accepted
+
+
+    def send_content(self, status, mime, content, head=False, headers=None):
+        """
+        Send complete response with Content-Length so the connection can be kept alive.
+        JSON responses larger than GZIP_MIN_SIZE are gzip compressed for clients that accept it.
+        """
+
+        headers = headers or {}
+        compress = status == 200 and mime == "application/json" and len(content) >= GZIP_MIN_SIZE
+        if compress:
+            headers = dict(headers, Vary='Accept-Encoding')
+            compress = 'gzip' in self.accepted_encodings()
+            if compress and 'ETag' in headers:
+                headers['ETag'] = headers['ETag'][:-1] + '-gzip"'
+
+        if status == 200 and self.not_modified(headers.get('ETag'), headers.get('Last-Modified')):
+            self.send_not_modified(headers)
+            return
+        
+        if compress:
+            content = self.compress(content, headers.get('ETag'))
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        if mime is not None:
+            self.send_header('Content-type', mime)
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        if not head:
+            self.wfile.write(content)
+
+
+    def send_file(self, path, mime, head=False, headers=None):
+        """
+        Stream file with zero-copy sendfile, supporting conditional requests and single byte ranges (Range, If-Range)
+        """
+
+        headers = headers or {}
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            modified = self.date_time_string(int(stat.st_mtime))
+            etag = headers.get('ETag', '"{:x}-{:x}"'.format(stat.st_mtime_ns, size))
+            headers = dict(headers, **{'ETag': etag, 'Last-Modified': modified})
+
+            # Client copy is current (HTTP 304)
+            if self.not_modified(etag, modified):
+                self.send_not_modified(headers)
+                return
+
+            # Only honour Range if the client's copy is still current
+            byte_range = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if byte_range is not None and if_range is not None and if_range not in (etag, modified):
+                byte_range = None
+            
+            start, end = 0, size - 1
+            status = 200
+            if byte_range is not None:
+                parsed = self.parse_range(byte_range, size)
+                if parsed is False:
+                    # Range can not be satisfied (HTTP 416)
+                    self.send_response(416)
+                    self.send_header('Content-Range', 'bytes */{}'.format(size))
+                    self.send_header('Content-Length', '0')
                     self.end_headers()
                     return
-                
-                self.path = safe_path
-
-                if os.path.isfile(self.path):                           # Requested file exists (HTTP 200)
-                    self.send_response(200)
-                    mime = mimetypes.guess_type(self.path)[0]
-                    self.send_header('Content-type', mime)
-                    
-                    # Get file size for Content-Length header
-                    file_size = os.path.getsize(self.path)
-                    self.send_header('Content-Length', str(file_size))
-                    self.end_headers()
-                    # Don't send body for HEAD requests
-                else:                                                   # Requested file not found (HTTP 404)
-                    self.send_response(404)
-                    self.end_headers()
-        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
-            # Client disconnected, nothing we can do
-            return
-        except Exception as e:
-            # Log other exceptions but don't crash
-            print(f"HTTP HEAD Server Error: {e}")
-            return
+                elif parsed is not None:
+                    start, end = parsed
+                    status = 206
+
+            self.send_response(status)
+            self.send_header('Content-type', mime or 'application/octet-stream')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            for key, value in headers.items():
+                self.send_header(key, value)
+            if status == 206:
+                self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+            self.end_headers()
+
+            if not head and size > 0:
+                # Uses os.sendfile where available, falls back to buffered send
+                self.connection.sendfile(f, start, end - start + 1)
+
+
+    def not_modified(self, etag, modified):
+        """
+        Check conditional request headers against response validators
+        (If-None-Match takes precedence over If-Modified-Since)
+        """
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            if etag is None:
+                return False
+            tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags
+        
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None and modified is not None:
+            try:
+                return email.utils.parsedate_to_datetime(if_modified_since) >= email.utils.parsedate_to_datetime(modified)
+            except (TypeError, ValueError):
+                return False
+        
+        return False
+
+
+    def send_not_modified(self, headers):
+        """
+        Send 304 Not Modified with validators and cache policy
+        """
+
+        self.send_response(304)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+
+    def parse_range(self, header, size):
+        """
+        Parse single byte range header into inclusive (start, end)
+
+        Returns None to ignore the header (malformed or multiple ranges) and False if the range is not satisfiable
+        """
+
+        unit, _, spec = header.partition('=')
+        if unit.strip() != 'bytes' or ',' in spec:
+            return None
+        
+        first, sep, last = spec.strip().partition('-')
+        try:
+            if not sep:
+                return None
+            elif first == '':
+                # Suffix range (last N bytes)
+                count = int(last)
+                if count <= 0: return False
+                return (max(0, size - count), size - 1)
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        
+        if start >= size:
+            return False
+        elif end < start:
+            return None
+        return (start, min(end, size - 1))
 
 
     def handle_api(self, path):
@@ -210,268 +855,385 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         Handle API endpoint request
         """
 
-        # Base response object
-        content = b''
-        status = 404
         mime = "application/json"
+        headers = {'Cache-Control': CACHE_REVALIDATE}
+
+        # Split query string from endpoint path
+        url = urllib.parse.urlsplit(path)
+        query = urllib.parse.parse_qs(url.query) if url.query else {}
+
+        # Requested image width (selects smallest pyramid level that suffices)
+        width = None
+        if 'w' in query:
+            try:
+                width = int(query['w'][0])
+                if width < 1: raise ValueError
+            except ValueError:
+                return self.api_error(400, 'Invalid image width')
+
+        # Requested image format (image is resized and re-encoded)
+        fmt = None
+        if 'fmt' in query:
+            fmt = query['fmt'][0].lower()
+            if fmt not in resize.FORMATS:
+                return self.api_error(400, 'Invalid image format (options: {})'.format(", ".join(resize.FORMATS)))
 
         # Requested endpoint path
-        path = path.replace("/api", "").split("/")
-        path = None if len(path) == 1 else path[1:]
+        segments = url.path[4:].split("/")[1:]
 
         # Validate path components
-        if path is not None:
-            for component in path:
-                if not self.is_valid_path_component(component):
-                    logging.warning(f"Invalid path component detected: {component}")
-                    status = 400
-                    content = {'error': 'Invalid path component'}
-                    return json.dumps(content).encode('utf-8'), status, mime
-
-        if path is None:                                        # Root API endpoint
-            content = {
-                'version': dash_config.version,
-                'spacecraft': dash_config.spacecraft,
-                'downlink': dash_config.downlink,
-                'vcid_blacklist': dash_config.blacklist,
-                'output_path': dash_config.output,
-                'images': dash_config.images,
-                'xrit': dash_config.xrit,
-                'interval': int(dash_config.interval)
-            }
-        
-        elif path[0] == "docs":                                 # API documentation endpoint
+        for component in segments:
+            if not self.is_valid_path_component(component):
+                logging.warning(f"Invalid path component detected: {component}")
+                return self.api_error(400, 'Invalid path component')
+
+        # Find route one path segment at a time
+        node = api_routes
+        route = None
+        for i, segment in enumerate(segments):
+            child = node.get(segment) or node.get(ROUTE_ANY)
+            if child is None:
+                route = node.get(ROUTE_REST)
+                break
+            node = child
+        else:
+            i = len(segments)
+            route = node.get(ROUTE_END)
+
+        if route is None:                                       # Endpoint not found
+            content, status = b'', 404
+        elif type(route) is StaticRoute:                        # Response built when the dashboard started
+            content, status = route.content, 200
+            headers['ETag'] = route.etag
+        else:
+            # Demuxer state is read from one immutable snapshot for the whole request
+            request = ApiRequest(segments, segments[i:], query, width, fmt, demuxer_instance.snapshot)
+            content, status, mime = route(self, request, headers)
+
+        # Send HTTP 200 OK if content has been updated (or 404 if endpoint was not found)
+        if status is None: status = 200 if content != b'' else 404
+
+        # Convert Python dict into JSON string
+        if type(content) is dict:
+            content = json.dumps(content, sort_keys=False).encode('utf-8')
+
+        if status != 200:
+            headers = {'Cache-Control': CACHE_NONE}
+        elif isinstance(content, bytes) and 'ETag' not in headers:
+            # Other responses are identified by their content
+            headers['ETag'] = '"{}"'.format(hashlib.sha1(content).hexdigest())
+
+        # Return response bytes (or path of file to stream), HTTP status code, content MIME type and cache headers
+        return content, status, mime, headers
+
+    def api_error(self, status, message):
+        """
+        Error response of a request that could not be routed
+        """
+
+        return json.dumps({'error': message}).encode('utf-8'), status, "application/json", {'Cache-Control': CACHE_NONE}
+
+    def state_headers(self, snapshot, headers):
+        """
+        Demuxer state is identified by its snapshot version (headers are formatted once per version)
+        """
+
+        global state_header_cache
+
+        cached = state_header_cache
+        if cached is None or cached[0] != snapshot.version:
+            cached = (snapshot.version, '"{}-{}"'.format(epoch, snapshot.version), self.date_time_string(int(snapshot.modified)))
+            state_header_cache = cached
+
+        headers['ETag'] = cached[1]
+        headers['Last-Modified'] = cached[2]
+
+    def api_state(self, request, headers):
+        """
+        /api/current/{vcid|progress|partial}, /api/latest/{image|xrit} - serialised by the demuxer whenever its state changes
+        """
+
+        self.state_headers(request.snapshot, headers)
+        return request.snapshot.routes["/".join(request.segments)], None, "application/json"
+
+    def api_latest_type(self, request, headers):
+        """
+        /api/latest/{type} - latest image of specific type (metadata, file details are read when the image is saved)
+        """
+
+        image_type = request.segments[1].upper()  # Convert to uppercase for consistency
+        self.state_headers(request.snapshot, headers)
+
+        content = request.snapshot.routes.get("latest/" + image_type)
+        if content is None:
+            # No image of this type found
             content = {
-                'endpoints': {
-                    '/api': 'System configuration and status information',
-                    '/api/docs': 'This API documentation',
-                    '/api/current/vcid': 'Currently processing Virtual Channel ID',
-                    '/api/current/progress': 'Current download progress for active products',
-                    '/api/latest/image': 'Metadata for the most recent image of any type',
-                    '/api/latest/{type}': 'Metadata for the most recent image of specific type',
-                    '/api/latest/{type}/image': 'Actual image file for the most recent image of specific type',
-                    '/api/latest/{type}/partial': 'Partial/preview image for actively downloading products',
-                    '/api/latest/xrit': 'Metadata for the most recent xRIT file'
-                },
-                'image_types': {
-                    'FD': {
-                        'name': 'Full Disk',
-                        'description': 'Full disk imagery covering the entire Earth hemisphere',
-                        'typical_size': 'Large (multiple MB)',
-                        'format': 'PNG/JPEG'
-                    },
-                    'SICEF24': {
-                        'name': 'Sea Ice and Cloud Edge Forecast',
-                        'description': 'Sea Ice and Cloud Edge Forecast (24-hour)',
-                        'typical_size': 'Medium (1-2 MB)',
-                        'format': 'PNG/JPEG'
-                    },
-                    'ADD': {
-                        'name': 'Additional Data',
-                        'description': 'Additional data products and supplementary imagery',
-                        'typical_size': 'Variable',
-                        'format': 'Various formats'
-                    }
-                },
-                'response_formats': {
-                    'metadata_endpoints': 'JSON with image path, hash, and type information',
-                    'image_endpoints': 'Raw image data with appropriate MIME type',
-                    'error_responses': 'JSON with error message when resource not found'
-                },
-                'example_usage': {
-                    'get_latest_fd_metadata': '/api/latest/fd',
-                    'get_latest_fd_image': '/api/latest/fd/image',
-                    'get_system_info': '/api',
-                    'get_current_vcid': '/api/current/vcid',
-                    'list_timelapses': '/api/timelapses',
-                    'get_timelapse_file': '/api/timelapses/{filename}'
-                }
+                'image': None,
+                'hash': None,
+                'type': image_type,
+                'error': f'No {image_type} image available'
             }
+        return content, None, "application/json"
+
+    def api_latest_image(self, request, headers):
+        """
+        /api/latest/{type}/image - serve actual image file
+        """
+
+        image_type = request.segments[1].upper()
+        width, fmt = request.width, request.fmt
+        if image_type not in request.snapshot.images:
+            return {'error': f'No {image_type} image available'}, 404, "application/json"
+
+        full_path, image_hash, full_width = request.snapshot.images[image_type]
+        image_path = full_path
+        if not image_path or not os.path.isfile(image_path):
+            return {'error': f'Image file not found for type {image_type}'}, 404, "application/json"
+
+        if width is not None and width >= (full_width or 0): width = None
+        if width is not None: image_path = products.get_level(image_path, width)
+
+        if full_width and (fmt is not None or (image_path == full_path and width is not None)):
+            # Resized to requested width and format (no saved level to serve)
+            # Images restored at startup are not hashed, so they are identified by modification time and size
+            if image_hash is None:
+                stat = os.stat(full_path)
+                image_hash = "{:x}-{:x}".format(stat.st_mtime_ns, stat.st_size)
+            fmt = fmt or resize.DEFAULT_FORMAT
+            try:
+                data = resize_cache.get((image_hash, width, fmt), full_path, width, fmt)
+            except OSError as e:
+                logging.error(f"Could not read {image_type} image for resize: {e}")
+                return {'error': f'Unreadable {image_type} image'}, 415, "application/json"
+            except Exception as e:
+                logging.error(f"Could not resize {image_type} image: {e}")
+                return {'error': f'Could not resize {image_type} image'}, 500, "application/json"
+            if data is not None:
+                headers['ETag'] = '"{}-{}-{}"'.format(image_hash, width or "full", fmt)
+                return data, None, resize.FORMATS[fmt].mime
+            
+            # Resize still running, serve the saved image for now (not cached, so the resized image is fetched next time)
+            headers['Cache-Control'] = CACHE_NONE
+            return pathlib.Path(image_path), None, mimetypes.guess_type(image_path)[0] or 'application/octet-stream'
+
+        # SHA-256 of full image computed by demuxer is a strong ETag
+        if image_path == full_path and image_hash:
+            headers['ETag'] = '"{}"'.format(image_hash)
+        return pathlib.Path(image_path), None, mimetypes.guess_type(image_path)[0] or 'application/octet-stream'
+
+    def api_latest_partial(self, request, headers):
+        """
+        /api/latest/{type}/partial - serve partial/preview image file
+        """
+
+        image_type = request.segments[1].upper()
+        if image_type not in request.snapshot.partials:
+            return {'error': f'No partial {image_type} image available'}, 404, "application/json"
+
+        partial_path = request.snapshot.partials[image_type]
+        if not partial_path or not os.path.isfile(partial_path):
+            return {'error': f'Partial image file not found for type {image_type}'}, 404, "application/json"
+
+        if request.width is not None:
+            # Reduced preview decoded at lower resolution
+            return self.get_preview(partial_path, request.width), None, "image/jpeg"
+        return pathlib.Path(partial_path), None, mimetypes.guess_type(partial_path)[0] or 'application/octet-stream'
+
+    def api_archive(self, request, headers):
+        """
+        /api/archive - archive catalogue query
+        """
+
+        content, status = self.query_archive(request.query)
+        return content, status, "application/json"
+
+    def api_cache(self, request, headers):
+        """
+        /api/cache - resized image cache statistics
+        """
+
+        headers['Cache-Control'] = CACHE_NONE
+        return resize_cache.stats(), None, "application/json"
+
+    def api_limits(self, request, headers):
+        """
+        /api/limits - rate limiter statistics
+        """
+
+        headers['Cache-Control'] = CACHE_NONE
+        return rate_limiter.stats(), None, "application/json"
+
+    def api_traces(self, request, headers):
+        """
+        /api/traces - stage timings of latest saved products
+        """
+
+        query = request.query
+        try:
+            limit = int(query['limit'][0]) if 'limit' in query else tracing.PAGE_SIZE
+            if not 1 <= limit <= tracing.RECENT_SIZE: raise ValueError
+        except ValueError:
+            return {'error': 'Invalid trace query'}, 400, "application/json"
         
-        elif path[0] == "timelapse":                           # Timelapse endpoints
-            if len(path) == 2 and path[1] == "list":
-                # /api/timelapse/list - list available timelapses
-                content = self.list_timelapses()
-        
-        elif path[0] == "timelapses":                          # Direct timelapse file serving from sibling directory
-            # /api/timelapses/{filename} - serve timelapse files from timelapses/ directory
-            if len(path) >= 2 and path[1]:  # Check that filename is not empty
-                filename = "/".join(path[1:])
-                # Get absolute path to timelapses directory
-                output_dir = os.path.abspath(dash_config.output)
-                timelapses_dir = os.path.join(os.path.dirname(output_dir), "timelapses")
-                timelapse_path = os.path.join(timelapses_dir, filename)
-                # Normalize the path and ensure it is within timelapses_dir
-                normalized_path = os.path.normpath(timelapse_path)
-                
-                # Use os.path.commonpath for robust cross-platform security check
-                try:
-                    if os.path.commonpath([normalized_path, timelapses_dir]) != timelapses_dir:
-                        status = 403
-                        content = {'error': 'Access denied'}
-                    elif os.path.isfile(normalized_path):
-                        mime = mimetypes.guess_type(normalized_path)[0] or 'application/octet-stream'
-                        content = open(normalized_path, 'rb').read()
-                    else:
-                        status = 404
-                        content = {'error': 'Timelapse file not found'}
-                except ValueError:
-                    # commonpath raises ValueError if paths are on different drives (Windows) or have no common path
-                    status = 403
-                    content = {'error': 'Access denied'}
-            else:
-                # List available timelapses when no filename specified or empty filename
-                content = self.list_timelapses()
-        
-        elif "/".join(path).startswith(dash_config.output):     # Endpoint starts with demuxer output root path
-            path = "/".join(path)
-            if (os.path.isfile(path)):
-                mime = mimetypes.guess_type(path)[0]
-                content = open(path, 'rb').read()
-
-        elif path[0] == "current" and len(path) == 2:
-            if path[1] == "vcid":
-                content = {
-                    'vcid': demuxer_instance.currentVCID
-                }
-            elif path[1] == "progress":
-                content = {
-                    'active_downloads': demuxer_instance.currentProgress
-                }
-            elif path[1] == "partial":
-                content = {
-                    'partial_images': demuxer_instance.partialImages
-                }
-
-        elif path[0] == "latest":
-            if len(path) == 2 and path[1] == "image":
-                # /api/latest/image - latest image of any type (metadata)
-                content = {
-                    'image': demuxer_instance.lastImage,
-                    'hash': demuxer_instance.lastImageHash,
-                    'type': demuxer_instance.lastImageType
-                }
-            elif len(path) == 2 and path[1] == "xrit":
-                # /api/latest/xrit - latest xRIT file
-                content = {
-                    'xrit': demuxer_instance.lastXRIT 
-                }
-            elif len(path) == 2:
-                # /api/latest/{type} - latest image of specific type (metadata)
-                image_type = path[1].upper()  # Convert to uppercase for consistency
-                if image_type in demuxer_instance.lastImageByType:
-                    type_data = demuxer_instance.lastImageByType[image_type]
-                    image_path = type_data['path']
-                    
-                    # Get additional file metadata
-                    timestamp = None
-                    size = None
-                    channel = None
-                    
-                    if image_path and os.path.isfile(image_path):
-                        try:
-                            # Get file modification time as ISO timestamp
-                            mtime = os.path.getmtime(image_path)
-                            timestamp = datetime.fromtimestamp(mtime).isoformat() + 'Z'
-                            
-                            # Get file size
-                            size = os.path.getsize(image_path)
-                            
-                            # Extract channel from filename if possible
-                            # Expected formats: IMG_[TYPE]_[SEQ]_[CHANNEL]_[DATE]_[TIME].jpg
-                            filename = os.path.basename(image_path)
-                            parts = filename.split('_')
-                            if len(parts) >= 4 and parts[0] in ['IMG', 'FDIMG']:
-                                # Channel might be like 'IR105' or just a number
-                                channel_part = parts[3]
-                                if channel_part.isdigit():
-                                    channel = int(channel_part)
-                                else:
-                                    channel = channel_part  # Keep as string for IR105, etc.
-                            elif len(parts) >= 3 and parts[0] == 'ADD':
-                                # ADD format doesn't have channel in same position
-                                channel = 'ADD'
-                        except (OSError, IOError):
-                            pass
-                    
-                    content = {
-                        'image': image_path,
-                        'hash': type_data['hash'],
-                        'type': image_type,
-                        'timestamp': timestamp,
-                        'size': size,
-                        'channel': channel
-                    }
-                else:
-                    # No image of this type found
-                    content = {
-                        'image': None,
-                        'hash': None,
-                        'type': image_type,
-                        'error': f'No {image_type} image available'
-                    }
-            elif len(path) == 3 and path[2] == "image":
-                # /api/latest/{type}/image - serve actual image file
-                image_type = path[1].upper()
-                if image_type in demuxer_instance.lastImageByType:
-                    image_path = demuxer_instance.lastImageByType[image_type]['path']
-                    if image_path and os.path.isfile(image_path):
-                        mime = mimetypes.guess_type(image_path)[0] or 'application/octet-stream'
-                        content = open(image_path, 'rb').read()
-                    else:
-                        status = 404
-                        content = {'error': f'Image file not found for type {image_type}'}
-                else:
-                    status = 404
-                    content = {'error': f'No {image_type} image available'}
-            elif len(path) == 3 and path[2] == "partial":
-                # /api/latest/{type}/partial - serve partial/preview image file
-                image_type = path[1].upper()
-                if image_type in demuxer_instance.partialImages:
-                    partial_path = demuxer_instance.partialImages[image_type]['path']
-                    if partial_path and os.path.isfile(partial_path):
-                        mime = mimetypes.guess_type(partial_path)[0] or 'application/octet-stream'
-                        content = open(partial_path, 'rb').read()
-                    else:
-                        status = 404
-                        content = {'error': f'Partial image file not found for type {image_type}'}
-                else:
-                    status = 404
-                    content = {'error': f'No partial {image_type} image available'}
+        image_type = query['type'][0].upper() if 'type' in query else None
+        headers['Cache-Control'] = CACHE_NONE
+        return {'traces': tracing.query(image_type, limit)}, None, "application/json"
+
+    def api_profile(self, request, headers):
+        """
+        /api/profile - sampling profiler state
+        """
+
+        headers['Cache-Control'] = CACHE_NONE
+        return dict(profiler.status(), enabled=dash_config.profiling), None, "application/json"
+
+    def api_profile_latest(self, request, headers):
+        """
+        /api/profile/latest - download last finished profile
+        """
+
+        last = profiler.status()['last']
+        if last is None or last['path'] is None or not os.path.isfile(last['path']):
+            return {'error': 'No profile available'}, 404, "application/json"
         
-        # Send HTTP 200 OK if content has been updated
-        if content != b'': status = 200
+        headers['Cache-Control'] = CACHE_NONE
+        headers['Content-Disposition'] = 'attachment; filename="{}"'.format(os.path.basename(last['path']))
+        mime = "application/json" if last['format'] == "speedscope" else "text/plain"
+        return pathlib.Path(last['path']), None, mime
 
-        # Convert Python dict into JSON string
-        if type(content) is dict:
-            content = json.dumps(content, sort_keys=False).encode('utf-8')
+    def api_timelapses(self, request, headers):
+        """
+        /api/timelapses, /api/timelapse/list - list available timelapses
+        """
 
-        # Return response bytes, HTTP status code and content MIME type
-        return content, status, mime
+        return list_timelapses(), None, "application/json"
 
-    def list_timelapses(self):
+    def api_timelapse_file(self, request, headers):
         """
-        List available timelapse files
+        /api/timelapses/{filename} - serve timelapse files from timelapses/ directory (sibling of output directory)
         """
+
         # Get absolute path to timelapses directory
         output_dir = os.path.abspath(dash_config.output)
         timelapses_dir = os.path.join(os.path.dirname(output_dir), "timelapses")
-        if not os.path.exists(timelapses_dir):
-            return {'timelapses': []}
-        
-        timelapses = []
-        for filename in os.listdir(timelapses_dir):
-            if filename.endswith(('.mp4', '.gif')):
-                filepath = os.path.join(timelapses_dir, filename)
-                stat = os.stat(filepath)
-                timelapses.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'created': stat.st_mtime,
-                    'url': f'/api/timelapses/{filename}'
-                })
-        
-        return {'timelapses': sorted(timelapses, key=lambda x: x['created'], reverse=True)}
+        timelapse_path = os.path.join(timelapses_dir, "/".join(request.rest))
+        # Normalize the path and ensure it is within timelapses_dir
+        normalized_path = os.path.normpath(timelapse_path)
+        
+        # Use os.path.commonpath for robust cross-platform security check
+        try:
+            if os.path.commonpath([normalized_path, timelapses_dir]) != timelapses_dir:
+                return {'error': 'Access denied'}, 403, "application/json"
+        except ValueError:
+            # commonpath raises ValueError if paths are on different drives (Windows) or have no common path
+            return {'error': 'Access denied'}, 403, "application/json"
+
+        if not os.path.isfile(normalized_path):
+            return {'error': 'Timelapse file not found'}, 404, "application/json"
+        return pathlib.Path(normalized_path), None, mimetypes.guess_type(normalized_path)[0] or 'application/octet-stream'
+
+    def api_file(self, request, headers):
+        """
+        /api/{output path}/... - received file requested by its path under the demuxer output root
+        """
+
+        path = os.path.join(dash_config.output, *request.rest)
+        if not os.path.isfile(path):
+            return b'', None, "application/json"
+
+        if request.width is not None: path = products.get_level(path, request.width)
+        if "_partial" not in path: headers['Cache-Control'] = CACHE_RECEIVED
+        return pathlib.Path(path), None, mimetypes.guess_type(path)[0]
+
+    def start_profile(self, query):
+        """
+        Start sampling profile with API query string parameters
+
+        Returns:
+            dict -- Response content
+            int -- HTTP status
+        """
+
+        try:
+            duration = float(query['duration'][0]) if 'duration' in query else profiler.DEFAULT_DURATION
+            fmt = query['format'][0].lower() if 'format' in query else profiler.FORMATS[0]
+            started = profiler.start(duration, fmt)
+        except ValueError:
+            return {'error': 'Invalid profile duration (up to {}s) or format (options: {})'.format(profiler.MAX_DURATION, ", ".join(profiler.FORMATS))}, 400
+        
+        if not started:
+            return dict(profiler.status(), error='Profile already running'), 409
+        return profiler.status(), 202
+
+    def query_archive(self, query):
+        """
+        Query archive catalogue with API query string parameters
+
+        Returns:
+            dict -- Response content
+            int -- HTTP status (None on success)
+        """
+
+        if demuxer_instance.archive is None:
+            return {'error': 'Archive catalogue is disabled'}, 404
+        
+        try:
+            image_type = query['type'][0].upper() if 'type' in query else None
+            channel = query['channel'][0].upper() if 'channel' in query else None
+            start = self.parse_time(query['start'][0]) if 'start' in query else None
+            end = self.parse_time(query['end'][0]) if 'end' in query else None
+            limit = int(query['limit'][0]) if 'limit' in query else archive.PAGE_SIZE
+            if not 1 <= limit <= archive.MAX_PAGE_SIZE: raise ValueError
+            cursor = tuple(int(c) for c in query['cursor'][0].split("-", 1)) if 'cursor' in query else None
+            if cursor is not None and len(cursor) != 2: raise ValueError
+        except ValueError:
+            return {'error': 'Invalid archive query'}, 400
+        
+        rows, total, next_cursor = demuxer_instance.archive.query(image_type, channel, start, end, limit, cursor)
+
+        images = []
+        for row in rows:
+            images.append({
+                'image': row['path'],
+                'url': file_url(row['path']),
+                'type': row['type'],
+                'channel': row['channel'],
+                'time': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(row['time'])),
+                'size': row['size'],
+                'hash': row['hash'],
+                'segments': row['segments'],
+                'total_segments': row['total']
+            })
+        
+        return {
+            'images': images,
+            'total': total,
+            'cursor': "{}-{}".format(*next_cursor) if next_cursor else None
+        }, None
+
+    def parse_time(self, value):
+        """
+        Parse ISO 8601 date/time (UTC unless an offset is given) or UTC seconds
+
+        Raises ValueError if the value is not a time
+        """
+
+        if value.isdigit():
+            return int(value)
+        
+        t = datetime.fromisoformat(value)
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        return int(t.timestamp())
+
+    def get_preview(self, image_path, width):
+        """
+        Get JPEG preview of an image at least `width` pixels wide
+        """
+
+        buf = io.BytesIO()
+        products.open_preview(image_path, width).save(buf, format="JPEG", quality=90)
+        return buf.getvalue()
 
     def is_safe_path(self, path):
         """
@@ -526,24 +1288,19 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         """
         Validate individual path components for API security
         """
-        # Check for common attack patterns
-        if not component or component in ['.', '..']:
-            return False
-        
-        # Check for null bytes and control characters
-        if '\x00' in component or any(ord(c) < 32 for c in component if c != '\t'):
+        # Reject current and parent folder references (common attack patterns)
+        if component in ('.', '..'):
             return False
         
-        # Check length (reasonable limit)
-        if len(component) > 100:
-            return False
-        
-        # Allow alphanumeric, dash, underscore, and dot
-        import re
-        if not re.match(r'^[a-zA-Z0-9._-]+$', component):
-            return False
-        
-        return True
+        # Allow alphanumeric, dash, underscore, and dot, up to 100 characters (no empty components, null bytes or control characters)
+        return PATH_COMPONENT.fullmatch(component) is not None
+
+    def log_request(self, code='-', size='-'):
+        """
+        Record response status for metrics (requests are logged when they are received)
+        """
+
+        self.status = int(code)
 
     def log_message(self, format, *args):
         """
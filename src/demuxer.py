@@ -8,18 +8,44 @@ Enhanced with real-time progress tracking and timeout handling
 Original work by sam210723: https://github.com/sam210723/xrit-rx
 """
 
-from collections import deque, namedtuple
+from collections import deque, namedtuple, OrderedDict
 import colorama
 from colorama import Fore, Back, Style
+from datetime import datetime
 import hashlib
+import json
 import os
+import queue
 import time
 from time import sleep
-from threading import Thread
+from threading import Lock, Thread
 import sys
+from types import MappingProxyType
 
+from PIL import Image
+
+import archive
 import ccsds as CCSDS
+import metrics
 import products
+import tracing
+
+EVENT_QUEUE_SIZE = 64       # Events queued per dashboard push client before its oldest events are dropped
+FILL_WINDOW = 1000          # VCDUs averaged by the fill ratio metric
+VCID_EVENT_INTERVAL = 1     # Minimum seconds between VCID changes sent to the dashboard (fill alternates with data many times a second)
+
+# Immutable copy of demuxer state served by the dashboard
+# (API routes to serialised JSON, latest image path, hash and width by type, and partial image path by type)
+Snapshot = namedtuple('Snapshot', 'version modified routes images partials')
+
+# Push events and the API route serving the same data
+EVENT_ROUTES = {
+    "vcid": "current/vcid",
+    "progress": "current/progress",
+    "partial": "current/partial",
+    "image": "latest/image",
+    "xrit": "latest/xrit"
+}
 
 
 class Demuxer:
@@ -39,20 +65,46 @@ class Demuxer:
         self.coreStop = False           # Core thread stop flag
         self.channels = {}              # List of channel handlers
         self.currentVCID = None         # Current Virtual Channel ID
+        self.publishedVCID = None       # Virtual Channel ID last sent to the dashboard
+        self.vcidPublished = 0          # Time VCID was last sent to the dashboard
         self.lastImage = None           # Last image output by demuxer
         self.lastImageHash = None       # SHA256 hash of last image
         self.lastImageType = None       # Type of last image (FD, etc.)
-        self.lastImageByType = {}       # Dictionary of last image by type {type: {'path': path, 'hash': hash}}
+        self.lastImageByType = {}       # Dictionary of last image by type {type: {'path': path, 'hash': hash, ...file metadata}}
         self.lastXRIT = None            # Last xRIT file output by demuxer
         self.currentProgress = {}       # Current download progress for active products
+        self.snapshot = None            # State served by dashboard (replaced, never modified, on every change)
+        self.subscribers = set()        # Event queues of dashboard push clients
+        self.subscriberLock = Lock()    # Guards subscriber set (clients connect from HTTP worker threads)
         self.partialImages = {}         # Dictionary of partial images by type {type: {'path': path, 'segments': count}}
         self.last_timeout_check = time.time()  # Last time we checked for timeouts
+        self.flushRequest = False       # Finalise all products once receive queue is empty
+        self.fillRatio = 0.0            # Moving average of fill VCDUs over roughly the last FILL_WINDOW VCDUs
+        self.archive = archive.Archive(config.output) if config.images and config.archive else None  # Catalogue of saved images
+        tracing.configure(config.output, config.trace_log)
+
+        if self.config.images:
+            self.warm_start()
+        self.publish_state()
+
+        # Demuxer state read when metrics are requested
+        metrics.Gauge("xrit_receive_queue_depth", "Packets waiting in the demuxer receive queue", collect=lambda: len(self.rxq))
+        metrics.Gauge("xrit_fill_ratio", "Fraction of fill VCDUs (VCID 63) over the last {} VCDUs".format(FILL_WINDOW), collect=lambda: round(self.fillRatio, 4))
+        metrics.Gauge("xrit_products_in_flight", "Products being assembled", collect=lambda: sum(len(c.products) for c in list(self.channels.values())))
+        metrics.Gauge("xrit_current_vcid", "Virtual channel of the last VCDU received", collect=lambda: self.currentVCID)
+
+        # CP_PDU CRC LUT (shared by channel handlers)
+        self.crclut = CCSDS.CP_PDU.CCITT_LUT(None)
 
         if self.config.downlink == "LRIT":
             self.coreWait = 54          # Core loop delay in ms for LRIT (108.8ms per packet @ 64 kbps)
         elif self.config.downlink == "HRIT":
             self.coreWait = 1           # Core loop delay in ms for HRIT (2.2ms per packet @ 3 Mbps)
 
+        # Rebuild in-flight products from checkpoint spool
+        if self.config.images and self.config.checkpoint:
+            self.restore()
+
         # Start core demuxer thread
         demux_thread = Thread()
         demux_thread.name = "DEMUX CORE"
@@ -69,7 +121,6 @@ class Demuxer:
 
         # Thread globals
         lastVCID = None                         # Last VCID seen
-        crclut = CCSDS.CP_PDU.CCITT_LUT(None)   # CP_PDU CRC LUT
         
         # Open VCDU dump file
         dumpf = None
@@ -78,13 +129,31 @@ class Demuxer:
 
         # Thread loop
         while not self.coreStop:
+            # Finalise timed out products periodically (every 30 seconds)
+            current_time = time.time()
+            if current_time - self.last_timeout_check > 30:
+                for channel in self.channels.values():
+                    channel.evict()
+                self.last_timeout_check = current_time
+
+            # Send latest VCID to dashboard, coalescing changes between fill and data
+            if self.currentVCID != self.publishedVCID and current_time - self.vcidPublished >= VCID_EVENT_INTERVAL:
+                self.publishedVCID = self.currentVCID
+                self.vcidPublished = current_time
+                self.publish_state("vcid")
+
             # Pull next packet from queue
-            packet = self.pull()
+            item = self.pull()
             
             # If queue is not empty
-            if packet is not None:
+            if item is not None:
                 # Parse VCDU
+                received, packet = item
                 vcdu = CCSDS.VCDU(packet)
+                vcdu.received = received
+                vcdu.dequeued = time.time()
+                metrics.VCDUS.inc(vcdu.VCID)
+                self.fillRatio += ((vcdu.VCID == 63) - self.fillRatio) / FILL_WINDOW
 
                 # Set current VCID
                 self.currentVCID = vcdu.VCID
@@ -129,20 +198,18 @@ class Demuxer:
                     self.channels[vcdu.VCID]
                 except KeyError:
                     # Create new channel handler instance
-                    ccfg = namedtuple('ccfg', 'spacecraft downlink verbose dump output images xrit blacklist keys VCID lut')
-                    self.channels[vcdu.VCID] = Channel(ccfg(*self.config, vcdu.VCID, crclut), self)
+                    self.new_channel(vcdu.VCID)
                     if self.config.verbose: print("  " + Fore.GREEN + Style.BRIGHT + "CREATED NEW CHANNEL HANDLER\n")
 
                 # Pass VCDU to appropriate channel handler
                 self.channels[vcdu.VCID].data_in(vcdu)
             else:
-                # No packet available, check for timeouts periodically
-                current_time = time.time()
-                if current_time - self.last_timeout_check > 30:  # Check every 30 seconds
+                # Finalise all products once queue is empty if requested
+                if self.flushRequest:
                     for channel in self.channels.values():
-                        channel.check_product_timeout()
-                    self.last_timeout_check = current_time
-                
+                        channel.flush()
+                    self.flushRequest = False
+
                 # Sleep thread
                 sleep(self.coreWait / 1000)
         
@@ -152,17 +219,37 @@ class Demuxer:
                 dumpf.close()
             return
 
+    def new_channel(self, vcid):
+        """
+        Creates channel handler for a virtual channel
+        """
+
+        ccfg = namedtuple('ccfg', self.config._fields + ('VCID', 'lut'))
+        self.channels[vcid] = Channel(ccfg(*self.config, vcid, self.crclut), self)
+        return self.channels[vcid]
+
+    def restore(self):
+        """
+        Rebuilds in-flight products (and their progress) from checkpointed segments
+        """
+
+        for info, segments in products.load_checkpoints(self.config.output):
+            vcid = info['vcid']
+            channel = self.channels[vcid] if vcid in self.channels else self.new_channel(vcid)
+            channel.restore(info, segments)
+
     def push(self, packet):
         """
         Takes in VCDUs for the demuxer to process
         :param packet: 892 byte Virtual Channel Data Unit (VCDU)
         """
 
-        self.rxq.append(packet)
+        self.rxq.append((time.time(), packet))
 
     def pull(self):
         """
         Pull data from receive queue
+        :return: Tuple of receive time and packet (None if queue is empty)
         """
 
         try:
@@ -179,6 +266,234 @@ class Demuxer:
 
         return len(self.rxq) == 0
 
+    def publish_state(self, *events):
+        """
+        Serialises state served by the dashboard into a new versioned snapshot, then sends events to push clients.
+        API requests serve snapshot bytes as-is and never read demuxer state while it is changing.
+        Only routes changed by the events are serialised again, the others are shared with the previous snapshot.
+
+        :param events: Names of push events to send (data comes from the matching snapshot route), none rebuilds every route
+        """
+
+        previous = self.snapshot
+        changed = set(events) if events and previous is not None else set(EVENT_ROUTES)
+
+        routes = {}
+        if "vcid" in changed:
+            routes['current/vcid'] = {'vcid': self.publishedVCID}
+        if "progress" in changed:
+            routes['current/progress'] = {'active_downloads': self.currentProgress}
+        if "partial" in changed:
+            routes['current/partial'] = {'partial_images': self.partialImages}
+        if "image" in changed:
+            routes['latest/image'] = {'image': self.lastImage, 'hash': self.lastImageHash, 'type': self.lastImageType}
+            for image_type, info in self.lastImageByType.items():
+                routes['latest/' + image_type] = {
+                    'image': info['path'],
+                    'hash': info['hash'],
+                    'type': image_type,
+                    'timestamp': info['timestamp'],
+                    'size': info['size'],
+                    'channel': info['channel'],
+                    'levels': info['levels']
+                }
+        if "xrit" in changed:
+            routes['latest/xrit'] = {'xrit': self.lastXRIT}
+        
+        serialised = dict(previous.routes) if previous is not None else {}
+        serialised.update({route: json.dumps(content).encode('utf-8') for route, content in routes.items()})
+
+        self.snapshot = Snapshot(
+            0 if previous is None else previous.version + 1,
+            time.time(),
+            MappingProxyType(serialised),
+            MappingProxyType({t: (i['path'], i['hash'], i['width']) for t, i in self.lastImageByType.items()}) if "image" in changed else previous.images,
+            MappingProxyType({t: p['path'] for t, p in self.partialImages.items()}) if "partial" in changed else previous.partials
+        )
+
+        for event in events:
+            self.publish(event, self.snapshot.routes[EVENT_ROUTES[event]])
+
+    def subscribe(self):
+        """
+        Registers a bounded event queue for a dashboard push client
+        """
+
+        q = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self.subscriberLock:
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        """
+        Removes event queue of a disconnected dashboard push client
+        """
+
+        with self.subscriberLock:
+            self.subscribers.discard(q)
+
+    def publish(self, event, data):
+        """
+        Sends event to dashboard push clients as a serialised server-sent event.
+        Clients that fall behind lose their oldest queued events rather than blocking the demuxer.
+
+        :param event: Event name
+        :param data: Event data (dict, or bytes already serialised as JSON)
+        """
+
+        if not self.subscribers:
+            return
+        
+        if not isinstance(data, bytes):
+            data = json.dumps(data).encode('utf-8')
+        message = b"event: %s\nid: %d\ndata: %s\n\n" % (event.encode('utf-8'), self.snapshot.version, data)
+        self.broadcast(message)
+
+    def close_subscribers(self):
+        """
+        Ends dashboard push client streams waiting on their event queues
+        """
+
+        self.broadcast(None)
+
+    def broadcast(self, message):
+        """
+        Queues message for every dashboard push client, dropping the oldest queued message of clients that are full
+
+        :param message: Serialised server-sent event, or None to end the stream
+        """
+
+        with self.subscriberLock:
+            subscribers = list(self.subscribers)
+        
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def flush(self):
+        """
+        Finalises all in-flight products once the receive queue is empty (e.g. at the end of an input file)
+        """
+
+        self.flushRequest = True
+        while self.flushRequest and not self.coreStop:
+            sleep(self.coreWait / 1000)
+
+    def warm_start(self):
+        """
+        Restores latest image of each type (and latest xRIT file) after a restart, so the dashboard
+        has images before the next product arrives. Uses the archive catalogue when it has images,
+        otherwise scans only the newest date folders. Images are not hashed (catalogue hashes are used when known).
+        """
+
+        start = time.time()
+
+        latest = {}
+        if self.archive is not None:
+            latest = {t: (row['path'], row['hash']) for t, row in self.archive.latest().items()}
+        
+        if not latest or self.config.xrit:
+            scanned, xrit = archive.scan_latest(self.config.output)
+            if not latest:
+                latest = {t: (path, None) for t, path in scanned.items()}
+            if self.config.xrit:
+                self.lastXRIT = xrit
+        
+        for image_type, (path, image_hash) in latest.items():
+            try:
+                self.lastImageByType[image_type] = self._get_image_info(path, image_hash)
+            except OSError:
+                continue
+        
+        if not self.lastImageByType:
+            return
+        
+        # Newest image of any type by observation time
+        self.lastImageType, info = max(self.lastImageByType.items(), key=lambda i: archive.parse_name(i[1]['path'])[2])
+        self.lastImage = info['path']
+        self.lastImageHash = info['hash']
+
+        print(Fore.GREEN + Style.BRIGHT + "RESTORED LATEST IMAGES OF {} TYPES IN {:.0f} ms".format(
+            len(self.lastImageByType),
+            (time.time() - start) * 1000
+        ))
+
+    def _get_image_info(self, image_path, image_hash):
+        """
+        Reads file metadata served for the latest image of a type
+
+        :param image_path: Path to the image file
+        :param image_hash: SHA256 hash of the image file (None if unknown)
+        """
+
+        stat = os.stat(image_path)
+        try:
+            with Image.open(image_path) as img:
+                width = img.size[0]
+        except OSError:
+            width = None    # Not an image Pillow can read (e.g. some ADD products)
+        
+        return {
+            'path': image_path,
+            'hash': image_hash,
+            'width': width,
+            'timestamp': datetime.fromtimestamp(stat.st_mtime).isoformat() + 'Z',
+            'size': stat.st_size,
+            'channel': self._get_channel(os.path.basename(image_path).split('_')),
+            'levels': self._get_levels(image_path)
+        }
+
+    def _get_channel(self, parts):
+        """
+        Extracts channel from image file name parts
+
+        :param parts: File name split on underscores
+        """
+
+        # Expected formats: IMG_[TYPE]_[SEQ]_[CHANNEL]_[DATE]_[TIME].jpg
+        if len(parts) >= 4 and parts[0] in ['IMG', 'FDIMG']:
+            # Channel might be like 'IR105' or just a number
+            channel_part = parts[3]
+            if channel_part.isdigit():
+                return int(channel_part)
+            else:
+                return channel_part  # Keep as string for IR105, etc.
+        elif len(parts) >= 3 and parts[0] == 'ADD':
+            # ADD format doesn't have channel in same position
+            return 'ADD'
+        
+        return None
+
+    def _get_levels(self, image_path):
+        """
+        Lists saved resolution levels of an image (None if no pyramid was saved)
+
+        :param image_path: Path to the image file
+        """
+
+        manifest = products.load_manifest(image_path)
+        if manifest is None:
+            return None
+        
+        return [
+            {
+                'level': level['level'],
+                'width': level['width'],
+                'height': level['height'],
+                'size': level['size']
+            }
+            for level in manifest['levels']
+        ]
+
     def stop(self):
         """
         Stops the demuxer loop by setting thread stop flag
@@ -197,12 +512,13 @@ class Channel:
         Initialises virtual channel data handler
         """
 
-        self.config = config        # Configuration tuple
-        self.counter = -1           # VCDU continuity counter
-        self.cCPPDU = None          # Current CP_PDU object
-        self.cTPFile = None         # Current TP_File object
-        self.cProduct = None        # Current product object
-        self.demuxer = parent       # Demuxer class instance (parent)
+        self.config = config            # Configuration tuple
+        self.counter = -1               # VCDU continuity counter
+        self.cCPPDU = None              # Current CP_PDU object
+        self.cTPFile = None             # Current TP_File object
+        self.vcdu = None                # Last VCDU received on channel
+        self.products = OrderedDict()   # Products being assembled by key, least recently updated first
+        self.demuxer = parent           # Demuxer class instance (parent)
 
 
     def data_in(self, vcdu):
@@ -213,6 +529,7 @@ class Channel:
 
         # Check VCDU continuity counter
         self.continuity(vcdu)
+        self.vcdu = vcdu
 
         # Parse M_PDU
         mpdu = CCSDS.M_PDU(vcdu.MPDU)
@@ -223,6 +540,7 @@ class Channel:
             if self.cTPFile is None and mpdu.POINTER == 0:
                 # Create CP_PDU for new TP_File
                 self.cCPPDU = CCSDS.CP_PDU(mpdu.PACKET)
+                self.cCPPDU.received = vcdu.received
             
             # Continue unfinished TP_File
             else:
@@ -236,6 +554,7 @@ class Channel:
 
                 try:
                     lenok, crcok = self.cCPPDU.finish(preptr, self.config.lut)
+                    self.count_CPPDU(lenok, crcok)
                     if self.config.verbose: self.check_CPPDU(lenok, crcok)
 
                     # Handle finished CP_PDU
@@ -247,6 +566,7 @@ class Channel:
                 # Create new CP_PDU
                 postptr = mpdu.PACKET[mpdu.POINTER:]
                 self.cCPPDU = CCSDS.CP_PDU(postptr)
+                self.cCPPDU.received = vcdu.received
 
                 # Need more data to parse CP_PDU header
                 if not self.cCPPDU.PARSED:
@@ -259,6 +579,7 @@ class Channel:
                     
                     try:
                         lenok, crcok = self.cCPPDU.finish(b'', self.config.lut)
+                        self.count_CPPDU(lenok, crcok)
                         if self.config.verbose: self.check_CPPDU(lenok, crcok)
 
                         # Handle finished CP_PDU
@@ -314,6 +635,7 @@ class Channel:
             
             diff = vcdu.COUNTER - self.counter - 1
             if diff > 0:
+                metrics.DROPPED_VCDUS.inc(vcdu.VCID, amount=diff)
                 if self.config.verbose:
                     print("  " + Fore.WHITE + Back.RED + Style.BRIGHT + "DROPPED {} PACKET{}    (CURRENT: {}   LAST: {}   VCID: {})".format(diff, "S" if diff > 1 else "", vcdu.COUNTER, self.counter, vcdu.VCID))
                 else:
@@ -322,6 +644,18 @@ class Channel:
         self.counter = vcdu.COUNTER
     
 
+    def count_CPPDU(self, lenok, crcok):
+        """
+        Counts finished CP_PDU and its length and CRC errors
+        """
+
+        metrics.CP_PDUS.inc(self.config.VCID)
+        if not lenok:
+            metrics.CP_PDU_ERRORS.inc(self.config.VCID, "length")
+        if not crcok:
+            metrics.CP_PDU_ERRORS.inc(self.config.VCID, "crc")
+
+
     def check_CPPDU(self, lenok, crcok):
         """
         Checks length and CRC of finished CP_PDU
@@ -352,6 +686,7 @@ class Channel:
         if cppdu.SEQ == cppdu.Sequence.FIRST:
             # Create new TP_File
             self.cTPFile = CCSDS.TP_File(cppdu.PAYLOAD[:-2])
+            self.cTPFile.received = cppdu.received
 
         elif cppdu.SEQ == cppdu.Sequence.CONTINUE:
             # Add data to TP_File
@@ -360,22 +695,30 @@ class Channel:
         elif cppdu.SEQ == cppdu.Sequence.LAST:
             # Close current TP_File
             lenok = self.cTPFile.finish(cppdu.PAYLOAD[:-2])
+            metrics.TP_FILES.inc(self.config.VCID)
 
             if self.config.verbose: self.cTPFile.print_info()
             if lenok:
                 if self.config.verbose: print("    " + Fore.GREEN + Style.BRIGHT + "LENGTH:     OK\n")
                 
                 # Handle S_PDU (decryption)
-                spdu = CCSDS.S_PDU(self.cTPFile.PAYLOAD, self.config.keys)
+                finished = time.time()
+                start = time.perf_counter()
+                spdu = self.decrypt(self.cTPFile.PAYLOAD)
 
                 # Handle xRIT file
-                self.handle_xRIT(spdu)
+                if spdu is not None:
+                    segment = None
+                    if self.cTPFile.received is not None and self.vcdu.received is not None:
+                        segment = tracing.Segment(self.cTPFile.received, self.vcdu.received, self.vcdu.dequeued, finished, time.perf_counter() - start)
+                    self.handle_xRIT(spdu, segment)
 
                 # Print key index
-                if self.config.verbose:
+                if self.config.verbose and spdu is not None:
                     print("    KEY INDEX:  0x{}\n".format(hex(int.from_bytes(spdu.index, byteorder="big"))[2:].upper()))
 
             elif not lenok:
+                metrics.TP_FILE_ERRORS.inc(self.config.VCID)
                 ex = self.cTPFile.LENGTH
                 ac = len(self.cTPFile.PAYLOAD)
                 diff = ac - ex
@@ -395,9 +738,33 @@ class Channel:
             print("    [TP_File]  CURRENT LEN: {} ({}%)     EXPECTED LEN: {}     DIFF: {}\n\n\n".format(ac, p, ex, diff))
 
 
-    def handle_xRIT(self, spdu):
+    def decrypt(self, payload):
+        """
+        Decrypts TP_File payload into an S_PDU, counting unknown key indexes and decryption errors
+
+        :param payload: TP_File payload
+        :return: S_PDU object (None if the file could not be decrypted)
+        """
+
+        try:
+            spdu = CCSDS.S_PDU(payload, self.config.keys)
+        except ValueError as e:
+            metrics.DECRYPT_ERRORS.inc("error")
+            print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "DECRYPTION FAILED ({})".format(e))
+            return None
+
+        if spdu.key == 0 and spdu.index not in (None, b'\x00\x00'):
+            metrics.DECRYPT_ERRORS.inc("unknown_key")
+        
+        return spdu
+
+
+    def handle_xRIT(self, spdu, segment=None):
         """
         Processes complete S_PDUs to build xRIT and Image files
+
+        :param spdu: Decrypted S_PDU
+        :param segment: Receive, reassembly and decrypt timing of the file (tracing.Segment)
         """
 
         # Create new xRIT object
@@ -407,102 +774,196 @@ class Channel:
         if self.config.xrit:
             xrit.save(self.config.output)
             self.demuxer.lastXRIT = xrit.get_save_path(self.config.output)
+            self.demuxer.publish_state("xrit")
 
         # Save image file if enabled
         if self.config.images:
-            # Create new product
-            if self.cProduct is None:
-                self.cProduct = products.new(self.config, xrit.FILE_NAME)
-                self.cProduct.print_info()
-            # Check if this is a different product (new sequence)
-            elif (hasattr(self.cProduct, 'name') and 
-                  self.cProduct.name.sequence != int(xrit.FILE_NAME.split("_")[2])):
-                # Force complete the previous product if it has enough segments
-                if (hasattr(self.cProduct, 'counter') and 
-                    self.cProduct.counter >= 3 and 
-                    not self.cProduct.complete):
-                    print(f"    " + Fore.YELLOW + Style.BRIGHT + 
-                          f"COMPLETING PREVIOUS PRODUCT ({self.cProduct.counter} segments, new sequence started)")
-                    self.cProduct.complete = True
-                    self.cProduct.save()
-                    self.demuxer.lastImage = self.cProduct.last
-                    self._update_image_metadata(self.cProduct.last)
-                    
-                    # Clean up tracking
-                    product_key = f"{self.cProduct.name.full}_{self.cProduct.name.mode}"
-                    if product_key in self.demuxer.currentProgress:
-                        del self.demuxer.currentProgress[product_key]
-                    product_type = self.cProduct.name.mode
-                    if product_type in self.demuxer.partialImages:
-                        del self.demuxer.partialImages[product_type]
-                
-                # Start new product
-                self.cProduct = products.new(self.config, xrit.FILE_NAME)
-                self.cProduct.print_info()
-            
-            # Add data to current product
-            self.cProduct.add(xrit)
+            # Get product this file belongs to, creating it if this is the first segment
+            key = products.get_key(self.config, xrit.FILE_NAME)
+            product = self.products.get(key)
+
+            if product is None:
+                product = products.new(self.config, xrit.FILE_NAME)
+                product.print_info()
+                self.products[key] = product
+            else:
+                # Mark product as most recently used
+                self.products.move_to_end(key)
             
-            # Check if product should timeout
-            self.check_product_timeout()
+            # Add data to product
+            if segment is not None:
+                product.trace.segment(segment)
+            product.add(xrit)
 
             # Update progress tracking for multi-segment products
-            if hasattr(self.cProduct, 'counter') and hasattr(self.cProduct, 'images'):
-                product_key = f"{self.cProduct.name.full}_{self.cProduct.name.mode}"
-                total_segs = {"LRIT": 10, "HRIT": 50}
-                expected_total = total_segs.get(self.config.downlink, 1)
-                
-                # Create progress info for multi-segment images
-                progress_info = {
-                    'product_name': self.cProduct.name.full,
-                    'product_type': self.cProduct.name.mode,
-                    'segments_received': self.cProduct.counter,
-                    'total_segments': expected_total,
-                    'progress_percent': (self.cProduct.counter / expected_total) * 100,
-                    'channels': {}
-                }
-                
-                # Add channel-specific progress
-                for channel in self.cProduct.images:
-                    progress_info['channels'][channel] = {
-                        'segments': list(self.cProduct.images[channel].keys()),
-                        'segment_count': len(self.cProduct.images[channel])
-                    }
-                
-                self.demuxer.currentProgress[product_key] = progress_info
-                
-                # Update partial image tracking if partial image was saved
-                if hasattr(self.cProduct, 'last_partial') and self.cProduct.last_partial:
-                    product_type = self.cProduct.name.mode
-                    self.demuxer.partialImages[product_type] = {
-                        'path': self.cProduct.last_partial,
-                        'segments': self.cProduct.counter,
-                        'total_segments': expected_total,
-                        'product_name': self.cProduct.name.full
-                    }
+            self.update_progress(product)
 
             # Save and clear complete product
-            if self.cProduct.complete:
-                self.cProduct.save()
-                self.demuxer.lastImage = self.cProduct.last
-                self._update_image_metadata(self.cProduct.last)
-                
-                # Remove from progress tracking when complete
-                product_key = f"{self.cProduct.name.full}_{self.cProduct.name.mode}"
-                if product_key in self.demuxer.currentProgress:
-                    del self.demuxer.currentProgress[product_key]
-                
-                # Remove partial image tracking when complete
-                product_type = self.cProduct.name.mode
-                if product_type in self.demuxer.partialImages:
-                    del self.demuxer.partialImages[product_type]
-                
-                self.cProduct = None
+            if product.complete:
+                self.finalise(key)
+            
+            # Finalise products that have timed out or exceed the memory budget
+            self.evict()
         else:
             # Print XRIT file info
             xrit.print_info(self.config.verbose)
 
 
+    def finalise(self, key, reason=None):
+        """
+        Removes product from product table, saving it if it is complete or has enough segments
+
+        :param key: Product table key
+        :param reason: Reason an incomplete product is being finalised (for console output)
+        """
+
+        product = self.products.pop(key)
+        saved = False
+
+        if product.complete or product.counter >= products.MIN_SEGMENTS:
+            metrics.PRODUCTS.inc(product.name.mode, "complete" if product.complete else "partial")
+            if not product.complete:
+                print("    " + Fore.YELLOW + Style.BRIGHT + "COMPLETING {} #{} ({}/{} segments, {})".format(
+                    product.name.mode,
+                    product.name.sequence,
+                    product.counter,
+                    product.total,
+                    reason
+                ))
+                product.complete = True
+
+            start = time.perf_counter()
+            product.save()
+            metrics.PRODUCT_SAVE.observe(time.perf_counter() - start, product.name.mode)
+            metrics.PRODUCT_LATENCY.observe(time.time() - product.start_time, product.name.mode)
+
+            product.trace.finish(product, product.last)
+
+            self.demuxer.lastImage = product.last
+            self._update_image_metadata(product.last)
+            saved = True
+
+            if self.demuxer.archive is not None:
+                self.demuxer.archive.add_product(product, self.demuxer.lastImageHash)
+        else:
+            # Not enough segments for an image, discard checkpointed segments
+            metrics.PRODUCTS.inc(product.name.mode, "dropped")
+            print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "DROPPING {} #{} ({} segments, {})".format(
+                product.name.mode,
+                product.name.sequence,
+                product.counter,
+                reason
+            ))
+            product.clear_checkpoint()
+        
+        # Remove from progress tracking
+        product_key = f"{product.name.full}_{product.name.mode}"
+        self.demuxer.currentProgress.pop(product_key, None)
+        
+        # Remove partial image tracking (unless it has been taken over by another product)
+        partial = self.demuxer.partialImages.get(product.name.mode)
+        if partial is not None and partial['product_name'] == product.name.full:
+            del self.demuxer.partialImages[product.name.mode]
+        
+        self.demuxer.publish_state("progress", "partial", *(["image"] if saved else []))
+
+    def evict(self):
+        """
+        Finalises products that have timed out, then least recently used products while over the memory budget
+        """
+
+        now = time.time()
+
+        # Products with no new segments for longer than the timeout
+        for key in [k for k, p in self.products.items() if now - p.last_segment_time > self.config.product_timeout]:
+            self.finalise(key, "{}s since last segment".format(int(now - self.products[key].last_segment_time)))
+        
+        # Least recently used products (oldest first) while over memory budget, always keeping the newest product
+        budget = self.config.product_memory * 1024 * 1024
+        while len(self.products) > 1 and sum(p.memory() for p in self.products.values()) > budget:
+            self.finalise(next(iter(self.products)), "memory budget exceeded")
+
+    def flush(self):
+        """
+        Finalises every product in the product table
+        """
+
+        for key in list(self.products):
+            self.finalise(key, "flushed")
+
+    def update_progress(self, product):
+        """
+        Updates demuxer progress and partial image tracking for a multi-segment product
+        """
+
+        if hasattr(product, 'received'):
+            product_key = f"{product.name.full}_{product.name.mode}"
+            expected_total = product.total
+            
+            # Create progress info for multi-segment images
+            progress_info = {
+                'product_name': product.name.full,
+                'product_type': product.name.mode,
+                'segments_received': product.counter,
+                'total_segments': expected_total,
+                'progress_percent': (product.counter / expected_total) * 100,
+                'channels': {}
+            }
+            
+            # Add channel-specific progress from received segment bitmasks
+            for channel, mask in product.received.items():
+                progress_info['channels'][channel] = {
+                    'segments': products.mask_to_list(mask),
+                    'missing': products.mask_to_list(product.get_missing(channel)),
+                    'segment_count': mask.bit_count(),
+                    'total_segments': product.get_segments(channel)
+                }
+            progress_info['duplicates'] = product.duplicates
+            
+            # Update partial image tracking if partial image was saved
+            events = ["progress"]
+            if hasattr(product, 'last_partial') and product.last_partial:
+                product_type = product.name.mode
+                self.demuxer.partialImages[product_type] = {
+                    'path': product.last_partial,
+                    'segments': product.counter,
+                    'total_segments': expected_total,
+                    'product_name': product.name.full
+                }
+                events.append("partial")
+            
+            self.demuxer.currentProgress[product_key] = progress_info
+            self.demuxer.publish_state(*events)
+
+    def restore(self, info, segments):
+        """
+        Rebuilds product from checkpointed segments
+        """
+
+        key = products.get_key(self.config, info['name'])
+        product = products.new(self.config, info['name'])
+        product.start_time = info.get('start_time', product.start_time)
+        self.products[key] = product
+
+        for seg in segments:
+            product.add(seg, restore=True)
+
+        print(Fore.GREEN + Style.BRIGHT + "RESTORED {} #{} FROM CHECKPOINT ({} SEGMENTS)".format(
+            product.name.mode,
+            product.name.sequence,
+            len(segments)
+        ))
+
+        # Save product straight away if every segment was checkpointed
+        if product.complete:
+            self.finalise(key)
+            return
+        
+        # Rebuild partial image and progress tracking
+        if product.counter >= products.MIN_SEGMENTS:
+            product.save_partial()
+        self.update_progress(product)
+
     def notify(self, vcid):
         """
         Notifies virtual channel handler of change in VCID
@@ -513,10 +974,11 @@ class Channel:
             # Channel has unfinished TP_File
             if self.cTPFile is not None:
                 # Handle S_PDU (decryption)
-                spdu = CCSDS.S_PDU(self.cTPFile.PAYLOAD, self.config.keys)
+                spdu = self.decrypt(self.cTPFile.PAYLOAD)
 
                 # Handle xRIT file
-                self.handle_xRIT(spdu)
+                if spdu is not None:
+                    self.handle_xRIT(spdu)
 
                 if len(self.cTPFile.PAYLOAD) < self.cTPFile.LENGTH:
                     print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "FILE IS INCOMPLETE")
@@ -527,31 +989,6 @@ class Channel:
 
                 # Clear finished TP_File
                 self.cTPFile = None
-            elif self.cProduct is not None:
-                # Save and clear current product
-                self.cProduct.save()
-                self.cProduct = None
-
-    def check_product_timeout(self):
-        """
-        Check if current product has timed out and should be completed
-        """
-        if (self.cProduct is not None and 
-            hasattr(self.cProduct, 'last_segment_time') and
-            not self.cProduct.complete):
-            
-            total_segs = {"LRIT": 10, "HRIT": 50}
-            expected_total = total_segs.get(self.config.downlink, 10)
-            
-            # If we haven't received segments for 2 minutes and have at least 70%
-            time_since_last = time.time() - self.cProduct.last_segment_time
-            completion_threshold = expected_total * 0.7
-            
-            if (time_since_last > 120 and self.cProduct.counter >= completion_threshold):
-                print(f"    " + Fore.YELLOW + Style.BRIGHT + 
-                      f"TIMING OUT PRODUCT ({self.cProduct.counter}/{expected_total} segments, "
-                      f"{int(time_since_last)}s since last segment)")
-                self.cProduct.complete = True
 
     def _update_image_metadata(self, image_path):
         """
@@ -582,11 +1019,8 @@ class Channel:
                 image_type = parts[1]  # FD, RWW3A, SICEF24, etc.
                 self.demuxer.lastImageType = image_type
                 
-                # Update type-specific tracking
-                self.demuxer.lastImageByType[image_type] = {
-                    'path': image_path,
-                    'hash': self.demuxer.lastImageHash
-                }
+                # Update type-specific tracking (file metadata is read once here, not on every API request)
+                self.demuxer.lastImageByType[image_type] = self.demuxer._get_image_info(image_path, self.demuxer.lastImageHash)
             else:
                 self.demuxer.lastImageType = "UNKNOWN"
         else:
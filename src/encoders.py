@@ -0,0 +1,304 @@
+"""
+encoders.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Output encoders and quality presets for image products
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import io
+import os
+import pathlib
+import time
+
+import numpy as np
+from PIL import Image
+
+
+# Encoder preset (file extension, Pillow format, Pillow save options, maximum bit depth)
+Preset = namedtuple("Preset", "ext format options depth")
+
+# Result of a single encode (time encoding and writing in seconds, time saved is only set for lossless JPEG joins)
+Result = namedtuple("Result", "preset path bytes time saved write", defaults=(None, 0.0))
+
+PRESETS = {
+    "jpeg-max":  Preset("jpg",  "JPEG", {'quality': 100, 'subsampling': 0}, 8),
+    "jpeg-high": Preset("jpg",  "JPEG", {'quality': 95}, 8),
+    "jpeg":      Preset("jpg",  "JPEG", {'quality': 90}, 8),
+    "jpeg-low":  Preset("jpg",  "JPEG", {'quality': 75}, 8),
+    "png":       Preset("png",  "PNG",  {'compress_level': 6}, 8),
+    "webp":      Preset("webp", "WEBP", {'lossless': True, 'method': 1, 'quality': 20}, 8),
+    "png16":     Preset("png",  "PNG",  {'compress_level': 6}, 16),
+    "tiff16":    Preset("tif",  "TIFF", {'compression': "tiff_deflate"}, 16),
+    "jpeg-concat": Preset("jpg", "JPEG", {'quality': 100, 'subsampling': 0}, 8)
+}
+DEFAULT = "jpeg-max"            # Preset used when none are configured (original xrit-rx output)
+CONCAT = "jpeg-concat"          # Preset joining LRIT JPEG segments losslessly (options are used for the fallback encode)
+WORKERS = min(4, os.cpu_count() or 1)
+
+pool = None                     # Encoder worker pool (created on first use)
+encode_times = {}               # Last encode time by (preset, image size), used to estimate time saved by joins
+
+# JPEG markers
+SOI = b"\xff\xd8"
+EOI = b"\xff\xd9"
+SOF0 = 0xC0
+DHT = 0xC4
+DQT = 0xDB
+DRI = 0xDD
+SOS = 0xDA
+
+
+def parse(value):
+    """
+    Parse comma separated list of preset names
+
+    Raises ValueError for unknown presets
+    """
+
+    names = tuple(n.strip().lower() for n in value.split(",") if n.strip())
+    for n in names:
+        if n not in PRESETS:
+            raise ValueError("Unknown encoder preset \"{}\" (options: {})".format(n, ", ".join(PRESETS)))
+
+    return names if names else (DEFAULT,)
+
+
+def get_pool():
+    """
+    Get encoder worker pool
+    """
+
+    global pool
+
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="ENCODER")
+    return pool
+
+
+def prepare(img, preset):
+    """
+    Convert image to a mode supported by the preset
+    """
+
+    if img.mode == "I;16" and preset.depth < 16:
+        # Shift 10-bit HRIT data down to 8-bit
+        iarr = (np.asarray(img, dtype=np.uint16) >> 2).astype(np.uint8)
+        return Image.fromarray(iarr)
+
+    return img
+
+
+def encode(img, path, name):
+    """
+    Encode image to disk using preset
+
+    Arguments:
+        img {Pillow.Image} -- Image to encode
+        path {string} -- Output path without extension
+        name {string} -- Preset name
+
+    Returns:
+        Result -- Output path, bytes written, time spent encoding and time spent writing
+    """
+
+    preset = PRESETS[name]
+    path = "{}.{}".format(path, preset.ext)
+
+    # Encode in memory so encode and disk write times are measured separately
+    start = time.perf_counter()
+    buf = io.BytesIO()
+    prepare(img, preset).save(buf, format=preset.format, **preset.options)
+    elapsed = time.perf_counter() - start
+    encode_times[(name, img.size)] = elapsed
+
+    start = time.perf_counter()
+    with open(path, "wb") as f:
+        f.write(buf.getbuffer())
+    
+    return Result(name, path, buf.tell(), elapsed, write=time.perf_counter() - start)
+
+
+def concat(img, path, name, segments, reason="missing segments"):
+    """
+    Join baseline JPEG segments into one JPEG without decoding them.
+    Falls back to encoding the canvas if the segments can not be joined.
+
+    Arguments:
+        img {Pillow.Image} -- Canvas holding decoded segments (used for fallback)
+        path {string} -- Output path without extension
+        name {string} -- Preset name
+        segments {list} -- JPEG segment bytes, top to bottom
+        reason {string} -- Reason reported when no segments are given
+
+    Returns:
+        Result -- Output path, bytes written, time spent and time saved (None after fallback)
+        string -- Reason segments could not be joined (None when joined)
+    """
+
+    if not segments:
+        return encode(img, path, name), reason
+
+    start = time.perf_counter()
+    try:
+        data = join_jpeg(segments, img.size)
+    except ValueError as e:
+        return encode(img, path, name), str(e)
+    elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with open("{}.{}".format(path, PRESETS[name].ext), "wb") as f:
+        f.write(data)
+    write = time.perf_counter() - start
+
+    # Measure fallback encode once per image size so time saved can be reported
+    key = (name, img.size)
+    if key not in encode_times:
+        t = time.perf_counter()
+        prepare(img, PRESETS[name]).save(io.BytesIO(), format=PRESETS[name].format, **PRESETS[name].options)
+        encode_times[key] = time.perf_counter() - t
+
+    return Result(name, f.name, len(data), elapsed, encode_times[key] - elapsed, write), None
+
+
+def parse_jpeg(data):
+    """
+    Split a baseline JPEG into its tables, frame header, scan header and entropy coded data
+
+    Raises ValueError if the JPEG is not a single scan baseline image
+    """
+
+    if data[:2] != SOI:
+        raise ValueError("segment is not a JPEG")
+
+    tables = b""
+    sof = None
+    pos = 2
+
+    while True:
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            raise ValueError("malformed JPEG header")
+        
+        marker = data[pos + 1]
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        body = data[pos + 4:pos + 2 + length]
+
+        if marker == SOF0:
+            sof = body
+        elif marker in (DQT, DHT):
+            tables += data[pos:pos + 2 + length]
+        elif marker == DRI:
+            if int.from_bytes(body, "big") != 0:
+                raise ValueError("segments use restart intervals")
+        elif marker == SOS:
+            sos = data[pos:pos + 2 + length]
+            pos += 2 + length
+            break
+        elif 0xC1 <= marker <= 0xCF:
+            raise ValueError("segments are not baseline JPEGs")
+        
+        # APPn and COM segments are dropped
+        pos += 2 + length
+    
+    if sof is None:
+        raise ValueError("segment has no frame header")
+
+    # Entropy coded data runs to EOI, only stuffed bytes and restart markers may appear in it
+    end = data.rfind(EOI)
+    if end < pos:
+        raise ValueError("segment is truncated")
+    scan = data[pos:end]
+    i = scan.find(b"\xff")
+    while i != -1:
+        if i + 1 >= len(scan) or not (scan[i + 1] == 0x00 or 0xD0 <= scan[i + 1] <= 0xD7):
+            raise ValueError("segments have more than one scan")
+        i = scan.find(b"\xff", i + 2)
+
+    return tables, sof, sos, scan
+
+
+def mcu_size(sof):
+    """
+    Width and height of a minimum coded unit from a frame header
+    """
+
+    # Frame header: precision, height, width, components, then (id, sampling, table) per component
+    if sof[5] == 1:
+        return (8, 8)
+    return (8 * max(c >> 4 for c in sof[7::3]), 8 * max(c & 0x0F for c in sof[7::3]))
+
+
+def check_segment(data):
+    """
+    Check a JPEG segment other than the last one of an image can be joined.
+    Lets segment data be dropped as soon as it arrives when the image will be re-encoded anyway
+    (GK-2A LRIT segments are 220 lines, which is not a whole number of 8 line blocks).
+
+    Raises ValueError if the segment can not be joined
+    """
+
+    _, sof, _, _ = parse_jpeg(data)
+    height = int.from_bytes(sof[1:3], "big")
+    mcu = mcu_size(sof)
+    if height % mcu[1]:
+        raise ValueError("segment height is not a multiple of {} lines".format(mcu[1]))
+
+
+def join_jpeg(segments, size=None):
+    """
+    Join baseline JPEG segments of equal width vertically without decoding them.
+    A restart marker is placed between segments, which resets DC prediction exactly as at the start of each segment.
+
+    Raises ValueError if segments do not share tables and frame parameters, are not MCU aligned
+    or do not add up to the expected image size
+    """
+
+    parsed = [parse_jpeg(s) for s in segments]
+    tables, sof, sos, _ = parsed[0]
+
+    width = int.from_bytes(sof[3:5], "big")
+    mcu = mcu_size(sof)
+    
+    heights = [int.from_bytes(p[1][1:3], "big") for p in parsed]
+    for p in parsed[1:]:
+        if p[0] != tables or p[2] != sos or p[1][:1] + p[1][3:] != sof[:1] + sof[3:]:
+            raise ValueError("segments have different tables or frame parameters")
+    if any(h % mcu[1] for h in heights[:-1]):
+        raise ValueError("segment height is not a multiple of {} lines".format(mcu[1]))
+    
+    # Restart interval is the number of MCUs in one segment
+    interval = -(-width // mcu[0]) * (heights[0] // mcu[1])
+    if any(h != heights[0] for h in heights[:-1]) or interval > 0xFFFF or sum(heights) > 0xFFFF:
+        raise ValueError("segment sizes can not be joined")
+    if size is not None and size != (width, sum(heights)):
+        raise ValueError("segments do not add up to {}x{}".format(*size))
+
+    out = bytearray(SOI)
+    out += tables
+    out += bytes([0xFF, SOF0]) + (len(sof) + 2).to_bytes(2, "big") + sof[:1] + sum(heights).to_bytes(2, "big") + sof[3:]
+    out += bytes([0xFF, DRI]) + (4).to_bytes(2, "big") + interval.to_bytes(2, "big")
+    out += sos
+    for i, p in enumerate(parsed):
+        if i > 0:
+            out += bytes([0xFF, 0xD0 + (i - 1) % 8])
+        out += p[3]
+    out += EOI
+
+    return bytes(out)
+
+
+def submit(img, path, name):
+    """
+    Queue encode in worker pool and return its future
+    """
+
+    return get_pool().submit(encode, img, path, name)
+
+
+def submit_concat(img, path, name, segments, reason="missing segments"):
+    """
+    Queue lossless JPEG join in worker pool and return its future
+    """
+
+    return get_pool().submit(concat, img, path, name, segments, reason)
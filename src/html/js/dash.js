@@ -56,6 +56,8 @@ var latest_image;
 var current_progress = {};
 var partial_images = {};
 var utc_date;
+var events;
+var polling;
 
 function init()
 {
@@ -124,15 +126,82 @@ function configure()
     }, 100);
     block_time(blocks.time.body);
 
-    // Setup polling loop
-    setInterval(poll, config.interval * 1000);
-    poll();
-    poll();
+    // Receive updates from event stream, fall back to polling if unavailable
+    if (!connect_events()) { start_polling(); }
+
+    // Setup block update loop
+    setInterval(update_blocks, config.interval * 1000);
+    update_blocks();
 
     return true;
 }
 
 
+/**
+ * Connect to xrit-rx event stream
+ */
+function connect_events()
+{
+    if (!window.EventSource) { return false; }
+
+    events = new EventSource("/api/events");
+
+    events.addEventListener("vcid", (e) => {
+        current_vcid = JSON.parse(e.data)['vcid'];
+        blocks.vchan.update(blocks.vchan.body);
+    });
+
+    events.addEventListener("image", (e) => {
+        latest_image = JSON.parse(e.data)['image'];
+        blocks.latestimg.update(blocks.latestimg.body);
+    });
+
+    events.addEventListener("progress", (e) => {
+        current_progress = JSON.parse(e.data)['active_downloads'];
+        blocks.progress.update(blocks.progress.body);
+    });
+
+    events.addEventListener("partial", (e) => {
+        partial_images = JSON.parse(e.data)['partial_images'];
+        blocks.progress.update(blocks.progress.body);
+    });
+
+    events.addEventListener("timelapse", (e) => {
+        loadTimelapses();
+        loadLatestTimelapse();
+    });
+
+    events.onopen = () => {
+        // Stream (re)connected, stop polling
+        if (polling) {
+            clearInterval(polling);
+            polling = null;
+            print("Event stream connected", "EVNT");
+        }
+    };
+
+    events.onerror = () => {
+        // Browser retries dropped streams, poll until it reconnects
+        if (!polling) {
+            print("Event stream unavailable, polling API", "EVNT");
+            start_polling();
+        }
+    };
+
+    return true;
+}
+
+
+/**
+ * Start polling xrit-rx API
+ */
+function start_polling()
+{
+    polling = setInterval(poll, config.interval * 1000);
+    poll();
+}
+
+
 /**
  * Poll xrit-rx API for updated data
  */
@@ -190,7 +259,15 @@ function poll()
         }
     });
 
-    // Call update function for each block
+    update_blocks();
+}
+
+
+/**
+ * Call update function for each block
+ */
+function update_blocks()
+{
     for (var block in blocks) {
         if (blocks[block].update != null) {
             blocks[block].update(blocks[block].body);
@@ -359,10 +436,13 @@ function block_latestimg(element)
     if (has_partial) {
         var url = `/api/latest/fd/partial`;
         var fname = `${partial_fd.product_name}_partial (${partial_fd.segments}/${partial_fd.total_segments} segments)`;
+
+        // Request preview reduced to the size of the block
+        var src = `${url}?w=${Math.round(blocks.latestimg.width * (window.devicePixelRatio || 1))}`;
         
         // Set <img> src attribute for partial image
-        if (img.getAttribute("src") != url) {
-            img.setAttribute("src", url);
+        if (img.getAttribute("src") != src) {
+            img.setAttribute("src", src);
             link.setAttribute("href", url);
             cap.innerText = fname;
             cap.style.color = "#FFA500"; // Orange color to indicate partial
@@ -377,9 +457,12 @@ function block_latestimg(element)
 
         // Set <img> src attribute for completed image
         if (ext != "txt") {
+            // Request smallest saved resolution level that fills the block
+            var src = `${url}?w=${Math.round(blocks.latestimg.width * (window.devicePixelRatio || 1))}`;
+
             // Only update image element if URL has changed
-            if (img.getAttribute("src") != url) {
-                img.setAttribute("src", url);
+            if (img.getAttribute("src") != src) {
+                img.setAttribute("src", src);
                 link.setAttribute("href", url);
                 cap.innerText = fname;
                 cap.style.color = ""; // Reset color for completed images
@@ -514,7 +597,7 @@ function block_progress(element)
             var channelInfo = document.createElement("div");
             channelInfo.className = "progress-channel";
             var channelData = progress.channels[channel];
-            channelInfo.textContent = `${channel}: ${channelData.segment_count} segments [${channelData.segments.join(', ')}]`;
+            channelInfo.textContent = `${channel}: ${channelData.segment_count}/${channelData.total_segments} segments [${channelData.segments.join(', ')}]`;
             progressItem.appendChild(channelInfo);
         }
         
@@ -0,0 +1,161 @@
+"""
+metrics.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Pipeline counters, gauges and histograms served by the dashboard in Prometheus text format
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds (seconds)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PRODUCT_BUCKETS = (1, 10, 30, 60, 120, 300, 600, 900, 1200, 1800, 3600)
+
+registry = OrderedDict()        # Metrics by name, in order of registration
+
+
+class Metric:
+    """
+    Metric with a value per combination of label values.
+    Values are either updated as events happen or read from `collect` when metrics are rendered.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, description, labels=(), collect=None):
+        self.name = name
+        self.description = description
+        self.labels = labels            # Label names
+        self.collect = collect          # Function returning value (or value by label values tuple) when rendered
+        self.values = {}                # Value by label values tuple
+        self.lock = Lock()
+
+        # Metrics registered again (e.g. by a new dashboard instance) replace the previous one
+        registry[name] = self
+
+    def samples(self):
+        """
+        Current samples as (name suffix, label values, extra labels, value)
+        """
+
+        if self.collect is not None:
+            values = self.collect()
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self.lock:
+                values = dict(self.values)
+
+        for labels, value in sorted(values.items()):
+            yield "", labels, (), value
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing count
+    """
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down
+    """
+
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=FAST_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *labels):
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self.values.items()}
+
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield "_bucket", labels, (("le", str(bound)),), cumulative
+            yield "_sum", labels, (), total
+            yield "_count", labels, (), cumulative
+
+
+def escape(value):
+    """
+    Escape label value for text exposition format
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    """
+    Render every registered metric in Prometheus text exposition format
+
+    Returns:
+        bytes -- Metrics text
+    """
+
+    lines = []
+    for metric in list(registry.values()):
+        lines.append("# HELP {} {}".format(metric.name, metric.description))
+        lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+
+        for suffix, values, extra, value in metric.samples():
+            labels = list(zip(metric.labels, values)) + list(extra)
+            label_text = "{" + ",".join('{}="{}"'.format(k, escape(v)) for k, v in labels) + "}" if labels else ""
+            lines.append("{}{}{} {}".format(metric.name, suffix, label_text, value if value is not None else "NaN"))
+
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# Demuxer
+VCDUS = Counter("xrit_vcdus_total", "VCDUs received by virtual channel (VCID 63 is fill)", ("vcid",))
+DROPPED_VCDUS = Counter("xrit_dropped_vcdus_total", "VCDUs missing from the continuity counter sequence", ("vcid",))
+CP_PDUS = Counter("xrit_cppdus_total", "CP_PDUs finished", ("vcid",))
+CP_PDU_ERRORS = Counter("xrit_cppdu_errors_total", "CP_PDUs failing the length or CRC check", ("vcid", "check"))
+TP_FILES = Counter("xrit_tpfiles_total", "TP_Files finished", ("vcid",))
+TP_FILE_ERRORS = Counter("xrit_tpfile_length_errors_total", "TP_Files skipped because their length did not match the header", ("vcid",))
+DECRYPT_ERRORS = Counter("xrit_decrypt_errors_total", "xRIT files with an unknown key index or that could not be decrypted", ("reason",))
+
+# Products
+SEGMENT_DECODE = Histogram("xrit_segment_decode_seconds", "Time to decode an image segment into its product canvas", ("downlink",))
+PRODUCT_SAVE = Histogram("xrit_product_save_seconds", "Time to encode and save a finished product", ("type",), SLOW_BUCKETS)
+PRODUCT_LATENCY = Histogram("xrit_product_latency_seconds", "Time from the first segment of a product until it was saved", ("type",), PRODUCT_BUCKETS)
+PRODUCTS = Counter("xrit_products_total", "Products finalised by outcome (complete, partial or dropped)", ("type", "outcome"))
+
+# Dashboard
+HTTP_REQUESTS = Counter("xrit_http_requests_total", "Dashboard HTTP requests by route class and status code", ("route", "status"))
+HTTP_LATENCY = Histogram("xrit_http_request_seconds", "Time to handle and send a dashboard HTTP response", ("route",))
@@ -11,12 +11,54 @@ Original work by sam210723: https://github.com/sam210723/xrit-rx
 import collections
 import colorama
 from colorama import Fore, Back, Style
+import encoders
 import io
+import json
+import metrics
 import numpy as np
+import os
 import pathlib
 from PIL import Image, ImageFile, UnidentifiedImageError
+import shutil
 import subprocess
 import time
+import tracing
+
+
+# Reduced resolution levels saved alongside completed multi-segment images (name, scale divisor)
+PYRAMID_LEVELS = (("half", 2), ("quarter", 4))
+THUMBNAIL_SIZE = 256
+
+# Minimum number of segments for an incomplete multi-segment product to be saved
+MIN_SEGMENTS = 3
+
+# Folder (inside output path) holding checkpointed segments of in-flight products
+SPOOL_DIR = ".spool"
+
+# Minimal xRIT file rebuilt from a checkpointed segment
+Segment = collections.namedtuple("Segment", "FILE_NAME DATA_FIELD")
+
+# Multi-segment image catalogue entry (segments per channel, channel image resolution)
+ImageSpec = collections.namedtuple("ImageSpec", "segments width height")
+
+# Multi-segment image catalogue indexed by (spacecraft, downlink, mode, channel)
+CATALOGUE = {
+    ("GK-2A", "LRIT", "FD", "IR105"): ImageSpec(10, 2200, 2200),
+    ("GK-2A", "HRIT", "FD", "IR105"): ImageSpec(10, 2750, 2750),
+    ("GK-2A", "HRIT", "FD", "IR123"): ImageSpec(10, 2750, 2750),
+    ("GK-2A", "HRIT", "FD", "SW038"): ImageSpec(10, 2750, 2750),
+    ("GK-2A", "HRIT", "FD", "WV069"): ImageSpec(10, 2750, 2750),
+    ("GK-2A", "HRIT", "FD", "VI006"): ImageSpec(10, 11000, 11000)
+}
+
+# Expected segments of a whole product (all channels) indexed by (spacecraft, downlink, mode)
+PRODUCT_SEGMENTS = {
+    key[:3]: sum(spec.segments for k, spec in CATALOGUE.items() if k[:3] == key[:3])
+    for key in CATALOGUE
+}
+
+# Segments per channel assumed for products missing from the catalogue
+DEFAULT_SEGMENTS = 10
 
 
 def new(config, name):
@@ -49,6 +91,126 @@ def new(config, name):
     return pclass(config, name)
 
 
+def get_key(config, name):
+    """
+    Get product table key (mode, sequence, channel) of an xRIT file.
+    All channels of a HRIT image are assembled into one product so share a key.
+    """
+
+    parts = name.split("_")
+
+    if parts[0] in ["IMG", "FDIMG"]:
+        channel = "<CHANNEL>" if config.downlink == "HRIT" else parts[3]
+    else:
+        channel = None
+
+    return (parts[1], int(parts[2]), channel)
+
+
+def mask_to_list(mask):
+    """
+    Get list of segment numbers set in a received segment bitmask (bit 0 is segment 1)
+    """
+
+    return [n + 1 for n in range(mask.bit_length()) if mask >> n & 1]
+
+
+def get_spec(config, mode, channel):
+    """
+    Get catalogue entry of a multi-segment image channel (None if not catalogued)
+    """
+
+    return CATALOGUE.get((config.spacecraft, config.downlink, mode, channel))
+
+
+def get_manifest_path(image_path):
+    """
+    Get path of the pyramid level manifest for an image
+    """
+
+    image_path = pathlib.Path(image_path)
+    return image_path.parent / "pyramid" / (image_path.stem + ".json")
+
+
+def load_manifest(image_path):
+    """
+    Load pyramid level manifest for an image (None if no manifest exists)
+    """
+
+    try:
+        with open(get_manifest_path(image_path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def get_level(image_path, width):
+    """
+    Get path of the smallest pyramid level at least `width` pixels wide.
+    Falls back to the original image if no manifest exists or no level is wide enough.
+    """
+
+    manifest = load_manifest(image_path)
+    if manifest is None:
+        return image_path
+
+    # Levels are stored largest first, reduced levels are kept next to the manifest
+    best = image_path
+    for level in manifest['levels'][1:]:
+        if level['width'] < width:
+            break
+        level_path = get_manifest_path(image_path).parent / pathlib.Path(level['path']).name
+        if level_path.is_file():
+            best = str(level_path)
+
+    return best
+
+
+def open_preview(path, width):
+    """
+    Open image (path or file object) reduced to the smallest size at least `width` pixels wide.
+    JPEGs are scaled while decoding (DCT domain) so a quarter-size preview needs a fraction of the decode work.
+    """
+
+    img = Image.open(path)
+    if img.format == "JPEG" and img.size[0] > width:
+        img.draft(img.mode, (width, img.size[1] * width // img.size[0]))
+    img.load()
+
+    return img
+
+
+def load_checkpoints(output):
+    """
+    Load checkpointed products from spool folder
+
+    Returns:
+        list -- (product info dict, list of Segment) for each checkpointed product
+    """
+
+    spool = pathlib.Path(output) / SPOOL_DIR
+    if not spool.is_dir():
+        return []
+    
+    checkpoints = []
+    for path in sorted(spool.iterdir()):
+        try:
+            with open(path / "product.json", "r") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            # Incomplete checkpoint (no product info written)
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        
+        segments = []
+        for seg in sorted(path.glob("*.seg")):
+            segments.append(Segment(seg.name[:-4], seg.read_bytes()))
+        
+        checkpoints.append((info, segments))
+    
+    return checkpoints
+
+
 class Product:
     """
     Product base class
@@ -60,8 +222,12 @@ class Product:
         self.alias = "PRODUCT"              # Product type alias
         self.complete = False               # Completed product flag
         self.last = None                    # Path to last file saved
+        self.saved = []                     # Paths of every file written by last save (every channel and encoder preset)
         self.start_time = time.time()       # When this product started downloading
         self.last_segment_time = time.time() # When last segment was received
+        self.total = 1                      # Expected number of segments
+        self.counter = 0                    # Number of unique segments received
+        self.trace = tracing.Trace()        # Time spent in each stage from first VCDU to file on disk
     
     def parse_name(self, n):
         """
@@ -131,6 +297,56 @@ class Product:
         ext_part = "" if not ext else ".{}".format(ext)
         return str(path / (filename_part + ext_part))
 
+    def memory(self):
+        """
+        Approximate memory held by product data in bytes
+        """
+
+        return 0
+
+    def get_spool_path(self):
+        """
+        Get checkpoint spool path of product
+        """
+
+        key = self.name.full.replace("<CHANNEL>", "MULTI")
+        return pathlib.Path(self.config.output) / SPOOL_DIR / key
+
+    def checkpoint(self, xrit):
+        """
+        Write received segment to checkpoint spool
+        """
+
+        path = self.get_spool_path()
+
+        # Write product info with first segment
+        if not path.is_dir():
+            path.mkdir(parents=True, exist_ok=True)
+            self.write_atomic(path / "product.json", json.dumps({
+                'name': xrit.FILE_NAME,
+                'vcid': self.config.VCID,
+                'start_time': self.start_time
+            }).encode('utf-8'))
+        
+        self.write_atomic(path / (xrit.FILE_NAME + ".seg"), xrit.DATA_FIELD)
+
+    def clear_checkpoint(self):
+        """
+        Remove checkpointed segments of product
+        """
+
+        shutil.rmtree(self.get_spool_path(), ignore_errors=True)
+
+    def write_atomic(self, path, data):
+        """
+        Write file via temporary file so partly written files are never left behind
+        """
+
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
     def print_info(self):
         """
         Print product info
@@ -154,15 +370,26 @@ class MultiSegmentImage(Product):
         Product.__init__(self, config, name)
         
         # Product specific setup
-        self.counter = 0                    # Segment counter
-        self.images = {}                    # Image list
-        self.ext = "jpg"                    # Output file extension
+        self.canvas = {}                    # Canvas per channel that segments are decoded into
+        self.jpegs = {}                     # JPEG segment data per channel (kept for lossless joins)
+        self.join_errors = {}               # Reason segments of a channel can not be joined losslessly
+        self.decodes = 0                    # Number of segment decodes (each segment is decoded once)
+        self.received = {}                  # Received segment bitmask per channel (bit 0 is segment 1)
+        self.duplicates = 0                 # Number of duplicate segments ignored
+        self.encodes = []                   # Encoder results of last save
+        self.mode = self.get_mode()         # Single band Pillow image mode of segments and canvas
         self.lastproglen = 0                # Last number of lines in progress indicator
         self.last_partial = None            # Path to last partial image saved
+        self.manifest = None                # Path to pyramid level manifest of last image saved
+        self.total = PRODUCT_SEGMENTS.get((config.spacecraft, config.downlink, self.name.mode), DEFAULT_SEGMENTS)    # Expected number of segments
 
-    def add(self, xrit):
+    def add(self, xrit, restore=False):
         """
         Add data to product
+
+        Arguments:
+            xrit {xRIT} -- xRIT file (or Segment) holding image segment
+            restore {bool} -- Segment is being restored from checkpoint spool
         """
 
         # Get channel and segment number
@@ -171,12 +398,21 @@ class MultiSegmentImage(Product):
 
         # Check object for current channel exists
         try:
-            self.images[chan]
+            self.received[chan]
         except KeyError:
-            self.images[chan] = {}
+            self.received[chan] = 0
+        
+        # Ignore duplicate or retransmitted segments
+        bit = 1 << (num - 1)
+        if self.received[chan] & bit:
+            self.duplicates += 1
+            if self.config.verbose:
+                print("    " + Fore.YELLOW + Style.BRIGHT + "IGNORING DUPLICATE SEGMENT {} OF {}".format(num, chan))
+            return
 
         # Get file name
         fname = xrit.FILE_NAME.split(".")[0]
+        start = time.perf_counter()
 
         if self.config.downlink == "LRIT":
             # Get image from JPG payload
@@ -191,32 +427,87 @@ class MultiSegmentImage(Product):
             # Get image from J2K payload
             img = self.convert_to_img(self.get_save_path(filename=False), fname, xrit.DATA_FIELD)
 
-        # Add segment to channel object
-        self.images[chan][num] = img
+        # Decode segment straight into channel canvas (segments that fail to decode are not counted, so a retransmission is accepted)
+        if not self.paste(chan, num, img, start):
+            return
+
+        # Keep JPEG data so the final image can be joined without re-encoding
+        if self.config.downlink == "LRIT" and encoders.CONCAT in self.config.encoders and chan not in self.join_errors:
+            try:
+                if num < self.get_segments(chan):
+                    encoders.check_segment(xrit.DATA_FIELD)
+                self.jpegs.setdefault(chan, {})[num] = xrit.DATA_FIELD
+            except ValueError as e:
+                # Image will be re-encoded, drop segment data kept so far
+                self.join_errors[chan] = str(e)
+                self.jpegs.pop(chan, None)
+
+        self.received[chan] |= bit
         self.counter += 1
         self.last_segment_time = time.time()  # Update last segment time
 
+        # Checkpoint segment so product survives restarts
+        if self.config.checkpoint and not restore:
+            self.checkpoint(xrit)
+
         # Update progress bar
-        if not self.config.verbose:
+        if not self.config.verbose and not restore:
             self.progress()
 
         # Mark product as complete
-        total_segs = { "LRIT": 10, "HRIT": 50 }
-        expected_total = total_segs[self.config.downlink]
-        
-        # Check for normal completion
-        if self.counter == expected_total:
-            self.complete = True
-        # Check for timeout-based completion (if we haven't received segments for 2 minutes and have at least 70%)
-        elif (time.time() - self.last_segment_time > 120 and 
-              self.counter >= (expected_total * 0.7)):
-            print(f"    " + Fore.YELLOW + Style.BRIGHT + f"COMPLETING PARTIAL PRODUCT ({self.counter}/{expected_total} segments, 2min timeout)")
+        # (incomplete products are finalised by the channel handler once they time out)
+        if self.counter == self.total:
             self.complete = True
         
         # Save partial image preview if we have enough segments
-        if self.counter >= 3 and not self.complete:
+        if self.counter >= MIN_SEGMENTS and not self.complete and not restore:
             self.save_partial()
 
+    def paste(self, chan, num, img, start):
+        """
+        Decode segment once into its channel canvas
+
+        Arguments:
+            chan {string} -- Channel name
+            num {int} -- Segment number
+            img {Pillow.Image} -- Segment image (LRIT segments are decoded lazily by Pillow)
+            start {float} -- When decoding started (performance counter)
+
+        Returns:
+            bool -- True if segment was pasted
+        """
+
+        try:
+            img.load()
+            self.decodes += 1
+
+            # Keep segment single band (LRIT segments are greyscale JPEGs)
+            if img.mode != self.mode:
+                img = img.convert(self.mode)
+        except OSError:
+            print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SKIPPING TRUNCATED IMAGE SEGMENT")
+            return False
+        decoded = time.perf_counter()
+        
+        # Create black canvas on first segment of channel
+        if chan not in self.canvas:
+            self.canvas[chan] = Image.new(self.mode, self.get_res(chan, img.size), color=0)
+
+        self.canvas[chan].paste(img, (0, img.size[1] * (num - 1)))
+
+        metrics.SEGMENT_DECODE.observe(decoded - start, self.config.downlink)
+        self.trace.add('decode', decoded - start)
+        self.trace.add('canvas', time.perf_counter() - decoded)
+        return True
+
+    def memory(self):
+        """
+        Approximate memory held by channel canvases in bytes
+        """
+
+        bpp = 2 if self.mode == "I;16" else 1
+        return sum(img.size[0] * img.size[1] * bpp for img in self.canvas.values())
+
     def save_partial(self):
         """
         Save partial product to disk as preview
@@ -224,61 +515,151 @@ class MultiSegmentImage(Product):
         
         path = self.get_save_path(filename=False)
 
-        for c in self.images:
-            # Create output image with black background
-            img = Image.new("RGB", self.get_res(c), color=(0, 0, 0))
-
-            # Combine available segments into partial image
-            for s in self.images[c]:
-                height = self.images[c][s].size[1]
-                offset = height * (s - 1)
-                
-                try:
-                    img.paste(
-                        self.images[c][s],
-                        ( 0, offset )
-                    )
-                except OSError:
-                    continue
-            
+        for c, img in self.canvas.items():
             # Get partial image path for current channel
-            channel_path = pathlib.Path(path) / (self.name.full.replace("<CHANNEL>", c) + "_partial." + self.ext)
+            channel_path = pathlib.Path(path) / (self.name.full.replace("<CHANNEL>", c) + "_partial")
 
-            # Save partial image
-            img.save(channel_path, format='JPEG', subsampling=0, quality=95)
-            self.last_partial = str(channel_path)  # Store partial image path
+            # Save canvas (missing segments are black)
+            result = encoders.encode(img, str(channel_path), "jpeg-high")
+            self.last_partial = result.path     # Store partial image path
 
     def save(self):
         """
-        Save product to disk
+        Save product to disk using configured encoder presets
         """
         
         path = self.get_save_path(filename=False)
-
-        for c in self.images:
-            # Create output image
-            img = Image.new("RGB", self.get_res(c))
-
-            # Combine segments into final image
-            for s in self.images[c]:
-                height = self.images[c][s].size[1]
-                offset = height * (s - 1)
-                
-                try:
-                    img.paste(
-                        self.images[c][s],
-                        ( 0, offset )
-                    )
-                except OSError:
-                    print("    " + Fore.WHITE + Back.RED + Style.BRIGHT + "SKIPPING TRUNCATED IMAGE SEGMENT")
+        self.encodes = []
+        self.saved = []
+
+        # Queue every channel in the encoder pool before waiting, so channels encode in parallel
+        queued = []
+        for c, img in self.canvas.items():
+            # Get image path (without extension) for current channel
+            channel_path = pathlib.Path(path) / self.name.full.replace("<CHANNEL>", c)
+
+            # Queue outputs in encoder pool (first preset is the primary output)
+            jobs = [
+                self.submit(img, c, self.get_output_path(channel_path, i), name)
+                for i, name in enumerate(self.config.encoders)
+            ]
+
+            # Queue reduced resolution levels while outputs encode
+            levels = self.queue_pyramid(img, channel_path) if self.config.pyramid else []
+            queued.append((c, img, jobs, levels))
+
+        for c, img, jobs, levels in queued:
+            # Wait for outputs
+            results = []
+            for name, job in zip(self.config.encoders, jobs):
+                r = job.result()
+                if name == encoders.CONCAT:
+                    r, reason = r
+                    if reason is not None:
+                        print("    " + Fore.YELLOW + Style.BRIGHT + "RE-ENCODING {} ({})".format(c, reason.upper()))
+                results.append(r)
             
-            # Get image path for current channel
-            channel_path = pathlib.Path(path) / (self.name.full.replace("<CHANNEL>", c) + "." + self.ext)
+            for r in results:
+                saved = "" if r.saved is None else ", joined losslessly, {:.2f}s saved".format(r.saved)
+                print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(r.path) + Style.RESET_ALL + " ({:.1f} KB in {:.2f}s{})".format(r.bytes / 1024, r.time + r.write, saved))
+            self.encodes += results
+            self.saved += [r.path for r in results]
+            self.trace.add('encode', sum(r.time for r in results))
+            self.trace.add('write', sum(r.write for r in results))
+            self.last = results[0].path
+
+            # Write level manifest once reduced levels have been saved
+            if levels:
+                self.save_manifest(img, results[0], [(name, size, job.result()) for name, size, job in levels])
+        
+        # Product is on disk, checkpointed segments are no longer needed
+        self.clear_checkpoint()
 
-            # Save final image
-            img.save(channel_path, format='JPEG', subsampling=0, quality=100)
-            print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(channel_path))
-            self.last = str(channel_path)  # Convert Path to string
+    def submit(self, img, chan, path, name):
+        """
+        Queue output of a channel in the encoder pool
+        """
+
+        if name != encoders.CONCAT:
+            return encoders.submit(img, path, name)
+        
+        # Lossless join needs every segment of the channel
+        segments = self.jpegs.get(chan, {})
+        if len(segments) != self.get_segments(chan) or self.received[chan] != (1 << len(segments)) - 1:
+            segments = []
+        
+        return encoders.submit_concat(img, path, name, [segments[n] for n in sorted(segments)], self.join_errors.get(chan, "missing segments"))
+
+    def get_output_path(self, path, index):
+        """
+        Get output path (without extension) for an encoder preset.
+        Additional outputs sharing an extension with an earlier preset are saved in a sub-folder named after the preset.
+        """
+
+        presets = self.config.encoders
+        ext = encoders.PRESETS[presets[index]].ext
+
+        if any(encoders.PRESETS[p].ext == ext for p in presets[:index]):
+            subdir = path.parent / presets[index]
+            subdir.mkdir(exist_ok=True)
+            return str(subdir / path.name)
+        
+        return str(path)
+
+    def queue_pyramid(self, img, path):
+        """
+        Queue reduced resolution levels of a completed image in the encoder pool.
+        Each level is reduced from the previous one so the canvas is only traversed once.
+        """
+
+        pyramid_path = path.parent / "pyramid"
+        pyramid_path.mkdir(exist_ok=True)
+        levels = []
+
+        # Reduce 8-bit canvas into each level
+        level = encoders.prepare(img, encoders.PRESETS["jpeg"])
+        scale = 1
+        for name, factor in PYRAMID_LEVELS:
+            level = level.reduce(factor // scale)
+            scale = factor
+            levels.append((name, level.size, encoders.submit(level, str(pyramid_path / "{}.{}".format(path.name, name)), "jpeg")))
+        
+        # Thumbnail from smallest level
+        level = level.copy()
+        level.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        levels.append(("thumb", level.size, encoders.submit(level, str(pyramid_path / "{}.thumb".format(path.name)), "jpeg")))
+
+        return levels
+
+    def save_manifest(self, img, full, levels):
+        """
+        Write pyramid level manifest for a completed image
+        """
+
+        manifest = {
+            'image': full.path,
+            'levels': [{
+                'level': "full",
+                'width': img.size[0],
+                'height': img.size[1],
+                'path': full.path,
+                'size': full.bytes
+            }]
+        }
+
+        for name, size, result in levels:
+            manifest['levels'].append({
+                'level': name,
+                'width': size[0],
+                'height': size[1],
+                'path': result.path,
+                'size': result.bytes
+            })
+
+        with open(get_manifest_path(full.path), "w") as f:
+            json.dump(manifest, f, indent=2)
+        
+        self.manifest = str(get_manifest_path(full.path))
     
     def convert_to_img(self, path, name, data):
         """
@@ -303,41 +684,52 @@ class MultiSegmentImage(Product):
         subprocess.call(["tools\\libjpeg\\jpeg", jp2Name, ppmName], stdout=subprocess.DEVNULL)
         pathlib.Path(jp2Name).unlink()
         
-        # Load and convert 16-bit PPM to 8-bit image
+        # Load 16-bit PPM and keep 16-bit or shift down to 8-bit (integer only)
         img = Image.open(ppmName)
-        iarr = np.uint8(np.array(img) / 4)
+        iarr = np.asarray(img, dtype=np.uint16)
+        if self.mode == "L":
+            iarr = (iarr >> 2).astype(np.uint8)
         img = Image.fromarray(iarr)
         pathlib.Path(ppmName).unlink()
         return img
     
-    def get_res(self, channel):
-        """
-        Returns the horizontal and vertical resolution of the given satellte, downlink, observation mode and channel
-        """
-
-        res = {
-            "GK-2A": {
-                "LRIT": {
-                    "FD": {
-                        "IR105": (2200, 2200)
-                    }
-                },
-                "HRIT": {
-                    "FD": {
-                        "IR105": (2750, 2750),
-                        "IR123": (2750, 2750),
-                        "SW038": (2750, 2750),
-                        "WV069": (2750, 2750),
-                        "VI006": (11000, 11000)
-                    }
-                }
-            }
-        }
+    def get_mode(self):
+        """
+        Returns Pillow image mode for segments and canvas based on downlink and configured bit depth
+        """
 
-        try:
-            return res[self.config.spacecraft][self.config.downlink][self.name.mode][channel]
-        except (KeyError, TypeError):
-            return (None, None)
+        # LRIT segments are 8-bit JPEGs, HRIT segments can be kept at 16-bit
+        if self.config.downlink == "HRIT" and self.config.depth == 16:
+            return "I;16"
+        else:
+            return "L"
+    
+    def get_res(self, channel, segment):
+        """
+        Returns the horizontal and vertical resolution of a channel from the product catalogue.
+        Channels missing from the catalogue are sized from the segment size.
+        """
+
+        spec = get_spec(self.config, self.name.mode, channel)
+        if spec is not None:
+            return (spec.width, spec.height)
+        
+        return (segment[0], segment[1] * DEFAULT_SEGMENTS)
+
+    def get_missing(self, channel):
+        """
+        Returns bitmask of segments not yet received for a channel
+        """
+
+        return ~self.received[channel] & ((1 << self.get_segments(channel)) - 1)
+
+    def get_segments(self, channel):
+        """
+        Returns the expected number of segments of a channel from the product catalogue
+        """
+
+        spec = get_spec(self.config, self.name.mode, channel)
+        return spec.segments if spec is not None else DEFAULT_SEGMENTS
 
     def progress(self):
         """
@@ -353,21 +745,13 @@ class MultiSegmentImage(Product):
         self.lastproglen = 0
 
         # Loop through channels
-        for c in self.images:
-            line += "    {}  {}{}{}{}{}{}{}{}{}{}  {}/{}\n".format(
+        for c in self.received:
+            total = self.get_segments(c)
+            line += "    {}  {}  {}/{}\n".format(
                 c,
-                "\u2588\u2588" if 1 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 2 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 3 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 4 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 5 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 6 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 7 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 8 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 9 in self.images[c].keys() else "\u2591\u2591",
-                "\u2588\u2588" if 10 in self.images[c].keys() else "\u2591\u2591",
-                len(self.images[c]),
-                10
+                "".join("\u2588\u2588" if self.received[c] >> n & 1 else "\u2591\u2591" for n in range(total)),
+                self.received[c].bit_count(),
+                total
             )
             self.lastproglen += 1
         
@@ -392,6 +776,7 @@ class SingleSegmentImage(Product):
         """
 
         self.payload = xrit.DATA_FIELD
+        self.counter = 1
         self.complete = True
 
     def save(self):
@@ -402,12 +787,15 @@ class SingleSegmentImage(Product):
         self.ext = self.get_ext()
         path = self.get_save_path(self.ext)
 
+        start = time.perf_counter()
         outf = open(path, mode="wb")
         outf.write(self.payload)
         outf.close()
+        self.trace.add('write', time.perf_counter() - start)
 
         print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(path))
         self.last = path
+        self.saved = [path]
 
     def get_ext(self):
         """
@@ -442,6 +830,7 @@ class AlphanumericText(Product):
         """
 
         self.payload = xrit.DATA_FIELD
+        self.counter = 1
         self.complete = True
 
     def save(self):
@@ -451,9 +840,11 @@ class AlphanumericText(Product):
 
         path = self.get_save_path(self.ext)
         
+        start = time.perf_counter()
         outf = open(path, mode="wb")
         outf.write(self.payload)
         outf.close()
+        self.trace.add('write', time.perf_counter() - start)
 
         # Detect GK-2A LRIT DOP
         if self.payload[:40].decode('utf-8') == "GK-2A AMI LRIT DOP(Daily Operation Plan)":
@@ -461,3 +852,4 @@ class AlphanumericText(Product):
 
         print("    " + Fore.GREEN + Style.BRIGHT + "Saved \"{}\"".format(path))
         self.last = path
+        self.saved = [path]
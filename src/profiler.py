@@ -0,0 +1,218 @@
+"""
+profiler.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Time-bounded sampling profiler of the demuxer, ingest and dashboard threads
+"""
+
+from collections import Counter
+from datetime import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+from colorama import Fore, Style
+
+
+DEFAULT_DURATION = 30           # Profile length when not given (seconds)
+MAX_DURATION = 600              # Longest profile that can be requested (seconds)
+INTERVAL = 0.01                 # Time between samples (seconds)
+FORMATS = ("collapsed", "speedscope")
+
+# Threads sampled, by name prefix (main thread reads input packets)
+THREADS = ("MainThread", "DEMUX CORE", "HTTP SERVER", "HTTP WORKER", "ENCODER", "RESIZE")
+
+output = "profiles"             # Folder profiles are written to
+lock = threading.Lock()
+current = None                  # Profile being sampled
+last = None                     # Status of last finished profile
+
+
+class Profile:
+    """
+    Samples stacks of the profiled threads in a background thread until its duration has passed
+    """
+
+    def __init__(self, duration, fmt):
+        self.duration = duration
+        self.fmt = fmt
+        self.start_time = time.time()
+        self.samples = 0                # Sampling passes over all threads
+        self.elapsed = 0.0              # Seconds sampled for
+        self.stacks = Counter()         # Samples by (thread name, frame labels from outermost)
+        self.labels = {}                # Frame label by code object
+
+        self.thread = threading.Thread(target=self.run, name="PROFILER", daemon=True)
+
+    def run(self):
+        """
+        Sampler thread
+        """
+
+        global current
+        global last
+
+        own = threading.get_ident()
+        start = time.perf_counter()
+        end = start + self.duration
+        due = start
+        while due < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident)
+                if ident != own and name is not None and name.startswith(THREADS):
+                    self.stacks[(name, self.stack(frame))] += 1
+            self.samples += 1
+
+            # Sample on a fixed schedule, skipping samples missed while other threads held the GIL
+            due += INTERVAL
+            now = time.perf_counter()
+            if now > due:
+                due = now
+            time.sleep(due - now)
+        self.elapsed = time.perf_counter() - start
+
+        try:
+            path = self.write()
+            print(Fore.GREEN + Style.BRIGHT + "PROFILE SAVED TO \"{}\" ({} SAMPLES)".format(path, self.samples))
+        except OSError as e:
+            path = None
+            print(Fore.RED + Style.BRIGHT + "PROFILE NOT SAVED ({})".format(e))
+
+        with lock:
+            last = dict(self.status(), path=path)
+            current = None
+
+    def stack(self, frame):
+        """
+        Frame labels of a stack from outermost to innermost call
+        """
+
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self.labels.get(code)
+            if label is None:
+                label = self.labels[code] = "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+            stack.append(label)
+            frame = frame.f_back
+
+        stack.reverse()
+        return tuple(stack)
+
+    def write(self):
+        """
+        Write profile to output folder
+
+        Returns:
+            string -- Profile path
+        """
+
+        os.makedirs(output, exist_ok=True)
+        name = "profile-{}".format(datetime.fromtimestamp(self.start_time).strftime("%Y%m%d-%H%M%S"))
+
+        if self.fmt == "speedscope":
+            path = os.path.join(output, name + ".speedscope.json")
+            with open(path, "w") as f:
+                json.dump(self.speedscope(name), f, separators=(",", ":"))
+        else:
+            # One "thread;outer;...;inner count" line per stack (flame graph collapsed format, also read by speedscope)
+            path = os.path.join(output, name + ".txt")
+            with open(path, "w") as f:
+                for (thread, stack), count in sorted(self.stacks.items()):
+                    f.write("{};{} {}\n".format(thread, ";".join(stack), count))
+
+        return path
+
+    def speedscope(self, name):
+        """
+        Build speedscope file with a sampled profile per thread (weights in seconds)
+        """
+
+        weight = self.elapsed / max(1, self.samples)
+        frames = {}
+        profiles = {}
+        for (thread, stack), count in sorted(self.stacks.items()):
+            profile = profiles.setdefault(thread, {
+                'type': "sampled",
+                'name': thread,
+                'unit': "seconds",
+                'startValue': 0,
+                'endValue': round(self.elapsed, 3),
+                'samples': [],
+                'weights': []
+            })
+            profile['samples'].append([frames.setdefault(label, len(frames)) for label in stack])
+            profile['weights'].append(round(count * weight, 6))
+
+        return {
+            '$schema': "https://www.speedscope.app/file-format-schema.json",
+            'name': name,
+            'exporter': "xrit-rx",
+            'shared': {'frames': [{'name': label} for label in frames]},
+            'profiles': list(profiles.values())
+        }
+
+    def status(self):
+        """
+        Profile settings, samples taken and threads seen so far
+        """
+
+        return {
+            'started': datetime.fromtimestamp(self.start_time).isoformat(timespec="seconds"),
+            'duration': self.duration,
+            'format': self.fmt,
+            'samples': self.samples,
+            'threads': sorted({thread for thread, _ in list(self.stacks)})
+        }
+
+
+def configure(path):
+    """
+    Set folder profiles are written to
+    """
+
+    global output
+
+    output = path
+
+
+def start(duration=DEFAULT_DURATION, fmt=FORMATS[0]):
+    """
+    Start sampling profile unless one is already running
+
+    Arguments:
+        duration {float} -- Seconds to sample for
+        fmt {string} -- Output format (collapsed or speedscope)
+
+    Returns:
+        bool -- True if profile was started
+    """
+
+    global current
+
+    if not 0 < duration <= MAX_DURATION or fmt not in FORMATS:
+        raise ValueError("Invalid profile duration or format")
+
+    with lock:
+        if current is not None:
+            return False
+        current = Profile(duration, fmt)
+        current.thread.start()
+
+    print(Fore.GREEN + Style.BRIGHT + "PROFILING FOR {}s".format(duration))
+    return True
+
+
+def status():
+    """
+    State of running profile and last finished profile
+    """
+
+    with lock:
+        return {
+            'running': current.status() if current is not None else None,
+            'last': last
+        }
@@ -0,0 +1,106 @@
+"""
+ratelimit.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Token bucket rate limits per client address and route class for the dashboard
+"""
+
+import math
+from threading import Lock
+import time
+
+
+# Requests per second allowed for each route class when not configured (0 disables the limit)
+DEFAULT_RATES = {
+    'metadata':  20,            # JSON API state, archive queries and event stream connections
+    'image':     5,             # Image files, partial previews and resized images
+    'timelapse': 10             # Timelapse lists and videos (players fetch videos in many range requests)
+}
+BURST_SECONDS = 5               # Bucket size in seconds of requests, so page loads and reconnects are not limited
+PRUNE_INTERVAL = 60             # Seconds between removing buckets of idle clients
+TOP_CLIENTS = 10                # Most limited clients listed in statistics
+
+
+class RateLimiter:
+    """
+    Token bucket per client address and route class.
+    Each request takes one token, buckets refill at the class rate up to `rate * BURST_SECONDS` tokens.
+    """
+
+    def __init__(self, rates):
+        self.rates = {c: r for c, r in rates.items() if r > 0}      # Requests per second by route class
+        self.buckets = {}               # [tokens, last refill time, requests limited] by (address, route class)
+        self.allowed = dict.fromkeys(rates, 0)
+        self.limited = dict.fromkeys(rates, 0)
+        self.pruned = time.monotonic()
+        self.lock = Lock()
+
+    def check(self, address, route_class):
+        """
+        Take a token from the bucket of a client and route class
+
+        Arguments:
+            address {string} -- Client IP address
+            route_class {string} -- Route class (None for routes that are not limited)
+
+        Returns:
+            int -- Seconds until the request would be allowed (0 if it is allowed)
+        """
+
+        rate = self.rates.get(route_class)
+        if rate is None:
+            return 0
+
+        now = time.monotonic()
+        burst = rate * BURST_SECONDS
+        with self.lock:
+            if now - self.pruned > PRUNE_INTERVAL:
+                self.prune(now)
+
+            bucket = self.buckets.get((address, route_class))
+            if bucket is None:
+                bucket = self.buckets[(address, route_class)] = [burst, now, 0]
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed[route_class] += 1
+                return 0
+
+            bucket[2] += 1
+            self.limited[route_class] += 1
+            return max(1, math.ceil((1 - bucket[0]) / rate))
+
+    def prune(self, now):
+        """
+        Remove buckets that have refilled completely (clients idle for at least `BURST_SECONDS`)
+        """
+
+        self.pruned = now
+        idle = [key for key, (tokens, last, _) in self.buckets.items() if now - last >= BURST_SECONDS]
+        for key in idle:
+            del self.buckets[key]
+
+    def stats(self):
+        """
+        Request counters by route class and most limited clients
+        """
+
+        with self.lock:
+            top = sorted((b for b in self.buckets.items() if b[1][2]), key=lambda b: b[1][2], reverse=True)[:TOP_CLIENTS]
+            return {
+                'classes': {
+                    c: {
+                        'rate': self.rates.get(c, 0),
+                        'burst': self.rates.get(c, 0) * BURST_SECONDS,
+                        'allowed': self.allowed[c],
+                        'limited': self.limited[c]
+                    } for c in self.allowed
+                },
+                'clients': len({address for address, _ in self.buckets}),
+                'top_limited': [
+                    {'client': address, 'class': c, 'limited': bucket[2]} for (address, c), bucket in top
+                ]
+            }
@@ -0,0 +1,174 @@
+"""
+resize.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Resized copies of images served by the dashboard API, kept in a byte size limited LRU cache
+"""
+
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import io
+import os
+from threading import Lock
+
+from PIL import Image
+
+import encoders
+import products
+
+
+# Output format (Pillow format, MIME type, Pillow save options)
+Format = namedtuple("Format", "format mime options")
+
+FORMATS = {
+    "jpeg": Format("JPEG", "image/jpeg", {'quality': 85}),
+    "webp": Format("WEBP", "image/webp", {'quality': 80, 'method': 4}),
+    "png":  Format("PNG",  "image/png",  {'compress_level': 6})
+}
+DEFAULT_FORMAT = "jpeg"         # Format of resized images when none is requested
+WORKERS = min(2, os.cpu_count() or 1)
+WAIT = 0.5                      # Seconds a request waits for a resize before it is served the unresized image
+
+
+def resize(path, width, fmt):
+    """
+    Decode image reduced to `width` pixels wide (never enlarged) and encode it in the requested format
+
+    Arguments:
+        path {string} -- Full resolution image path (a smaller pyramid level is used as the source if one was saved)
+        width {int} -- Output width in pixels (None keeps full size)
+        fmt {string} -- Format name
+
+    Returns:
+        bytes -- Encoded image
+    """
+
+    if width is None:
+        img = Image.open(path)
+    else:
+        img = products.open_preview(products.get_level(path, width), width)
+        img.thumbnail((width, img.size[1]), Image.LANCZOS)
+
+    img = encoders.prepare(img, encoders.PRESETS["jpeg"])
+    if fmt != "png" and img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    img.save(buf, format=FORMATS[fmt].format, **FORMATS[fmt].options)
+    return buf.getvalue()
+
+
+class ResizeCache:
+    """
+    Least recently used cache of resized images, limited by total size in bytes.
+    Resizes run in a small worker pool and concurrent requests for the same image share one resize.
+    Requests only wait briefly for a resize, so slow resizes do not hold dashboard worker threads.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes      # Cache size limit
+        self.entries = OrderedDict()    # Resized image bytes by key, least recently used first
+        self.pending = {}               # Futures of resizes in progress by key
+        self.bytes = 0                  # Total size of cached images
+        self.hits = 0                   # Requests served from cache
+        self.misses = 0                 # Requests that needed a resize
+        self.evictions = 0              # Images dropped to stay under the size limit
+        self.deferred = 0               # Requests that stopped waiting for a resize still in progress
+        self.lock = Lock()
+        self.pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="RESIZE")
+
+    def get(self, key, path, width, fmt, timeout=WAIT):
+        """
+        Get resized image, resizing it in the worker pool on a cache miss.
+        A resize that takes longer than the timeout carries on in the pool and is cached for later requests.
+
+        Arguments:
+            key {tuple} -- Cache key (image hash, width, format)
+            path {string} -- Full resolution image path
+            width {int} -- Output width in pixels (None keeps full size)
+            fmt {string} -- Format name
+            timeout {float} -- Seconds to wait for a resize (None waits until it is done)
+
+        Returns:
+            bytes -- Encoded image (None if the resize is still in progress)
+
+        Raises:
+            OSError -- Image could not be read (other exceptions if it could not be resized)
+        """
+
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+            self.misses += 1
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pool.submit(self.load, key, path, width, fmt)
+                self.pending[key] = future
+
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            with self.lock:
+                self.deferred += 1
+            return None
+        except Exception:
+            # Failed resizes are not kept, so the next request tries again
+            with self.lock:
+                if self.pending.get(key) is future: del self.pending[key]
+            raise
+
+    def load(self, key, path, width, fmt):
+        """
+        Resize image and add it to the cache (runs in worker pool)
+        """
+
+        try:
+            data = resize(path, width, fmt)
+        except Exception:
+            with self.lock:
+                self.pending.pop(key, None)
+            raise
+
+        with self.lock:
+            del self.pending[key]
+
+            # Images larger than the whole cache are served but not kept
+            if len(data) <= self.max_bytes:
+                self.entries[key] = data
+                self.bytes += len(data)
+
+                while self.bytes > self.max_bytes:
+                    _, old = self.entries.popitem(last=False)
+                    self.bytes -= len(old)
+                    self.evictions += 1
+
+        return data
+
+    def stats(self):
+        """
+        Cache hit/miss counters and size
+        """
+
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / requests, 3) if requests else None,
+                'evictions': self.evictions,
+                'deferred': self.deferred,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes
+            }
+
+    def stop(self):
+        """
+        Stop resize worker pool
+        """
+
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,865 @@
+"""
+benchmark.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Benchmarks for the xrit-rx processing pipeline.
+Results are printed as a table and can be saved as JSON to compare runs.
+"""
+
+import argparse
+import binascii
+from collections import namedtuple
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import re
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from Crypto.Cipher import DES
+import numpy as np
+from PIL import Image
+
+# Import xrit-rx modules from parent directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import products
+
+
+# Product configuration tuple (matches demuxer config fields used by products)
+pconfig = namedtuple('pconfig', 'spacecraft downlink verbose dump output images xrit blacklist keys pyramid depth encoders checkpoint product_timeout product_memory archive trace_log')
+
+# Fake xRIT file holding only the fields used by products
+xrit_file = namedtuple('xrit_file', 'FILE_NAME DATA_FIELD')
+
+# Dashboard configuration tuple (matches xrit-rx dash_config)
+dconfig = namedtuple('dconfig', 'port interval spacecraft downlink output images xrit blacklist version threads resize_cache connections rate_limits profiling')
+
+# API endpoints polled by the dashboard front end
+POLL_PATHS = ["/api/current/vcid", "/api/current/progress", "/api/current/partial", "/api/latest/image", "/api/latest/xrit"]
+
+# API endpoints timed by the dispatch benchmark (polling endpoints and other common requests)
+DISPATCH_PATHS = POLL_PATHS + ["/api/latest/fd", "/api", "/api/docs", "/api/latest/fd/image?w=400", "/api/timelapses/latest_3h_mp4.mp4"]
+
+# Recorded VCDU capture run by the pipeline benchmark when no captures are given
+SAMPLE_CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "samples", "GK-2A LRIT VCDU TEST.bin")
+
+VCDU_LEN = 892                  # VCDU length in bytes (6 byte header, 886 byte M_PDU)
+MPDU_DATA_LEN = 884             # M_PDU packet zone length in bytes
+PIPELINE_QUEUE = 1000           # VCDUs kept in the demuxer receive queue while feeding a stream
+HRIT_SEGMENT_BYTES = 300000     # Size of synthetic HRIT files (about one compressed HRIT Full Disk segment)
+
+# Key index and DES key of encrypted synthetic streams
+BENCH_KEY_INDEX = b'\x00\x01'
+BENCH_KEY = b'\x01\x23\x45\x67\x89\xab\xcd\xef'
+
+# Synthetic stream run by the pipeline benchmark (fill is the fraction of fill VCDUs, loss the fraction of VCDUs dropped)
+Scenario = namedtuple('Scenario', 'downlink encrypted fill loss')
+SCENARIOS = {
+    'lrit':             Scenario("LRIT", False, 0.0, 0.0),
+    'lrit-encrypted':   Scenario("LRIT", True, 0.0, 0.0),
+    'hrit':             Scenario("HRIT", False, 0.0, 0.0),
+    'hrit-encrypted':   Scenario("HRIT", True, 0.0, 0.0),
+    'hrit-fill':        Scenario("HRIT", True, 0.8, 0.0),
+    'hrit-loss':        Scenario("HRIT", True, 0.0, 0.001)
+}
+
+# Stages timed in the demuxer and encoder threads (receive and queue are waits, not processing)
+PIPELINE_STAGES = ("reassembly", "decrypt", "decode", "canvas", "encode", "write")
+
+# HRIT Full Disk products run by the pipeline benchmark from decoded segments (bit depth, encoder presets)
+HRIT_PRODUCTS = {
+    'hrit-image':       (8, ("jpeg-max",)),
+    'hrit-image-16':    (16, ("png16", "tiff16"))
+}
+HRIT_CHANNELS = ("IR105", "IR123", "SW038", "WV069")    # 2750x2750 Full Disk channels (VI006 is 11000x11000)
+
+
+def synthetic_segments(count=10, width=2200, height=220, quality=90, last=None):
+    """
+    Generate greyscale JPEG segments resembling an LRIT Full Disk image
+    (last segment can have a different height)
+    """
+
+    rng = np.random.default_rng(0)
+    segments = []
+
+    for i in range(count):
+        if i == count - 1 and last is not None:
+            height = last
+
+        # Smooth gradient with noise (compresses similarly to real imagery)
+        y, x = np.mgrid[0:height, 0:width]
+        arr = ((x / width) * 128 + ((y + i * height) / (width)) * 96 + rng.normal(0, 12, (height, width)))
+        arr = np.clip(arr, 0, 255).astype(np.uint8)
+
+        buf = io.BytesIO()
+        Image.fromarray(arr).save(buf, format='JPEG', quality=quality)
+        segments.append(buf.getvalue())
+
+    return segments
+
+
+def synthetic_hrit_segments(count=10, width=2750, height=275):
+    """
+    Generate 10-bit HRIT Full Disk segments as libjpeg decodes them from JPEG 2000 (16-bit arrays)
+    """
+
+    rng = np.random.default_rng(0)
+    segments = []
+
+    for i in range(count):
+        y, x = np.mgrid[0:height, 0:width]
+        arr = ((x / width) * 512 + ((y + i * height) / width) * 384 + rng.normal(0, 48, (height, width)))
+        segments.append(np.clip(arr, 0, 1023).astype(np.uint16))
+
+    return segments
+
+
+def decoded_hrit(arr, mode):
+    """
+    Segment image as MultiSegmentImage.convert_to_img returns it after the libjpeg JPEG 2000 decode
+    """
+
+    if mode == "L":
+        arr = (arr >> 2).astype(np.uint8)
+    return Image.fromarray(arr)
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes
+    """
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if platform.system() == "Darwin" else rss * 1024
+
+
+def bench_canvas(segments, mode, runs):
+    """
+    Assemble and encode segments into a single canvas of the given mode
+    """
+
+    timings = {'assemble': [], 'encode': []}
+    size = 0
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        imgs = [Image.open(io.BytesIO(s)) for s in segments]
+        canvas = Image.new(mode, (imgs[0].size[0], imgs[0].size[1] * len(imgs)))
+        for i, img in enumerate(imgs):
+            canvas.paste(img.convert(mode) if img.mode != mode else img, (0, img.size[1] * i))
+        timings['assemble'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        buf = io.BytesIO()
+        canvas.save(buf, format='JPEG', quality=100, subsampling=0)
+        timings['encode'].append(time.perf_counter() - start)
+        size = buf.tell()
+
+    return {
+        'mode': mode,
+        'canvas_bytes': canvas.size[0] * canvas.size[1] * len(canvas.getbands()),
+        'assemble_s': min(timings['assemble']),
+        'encode_s': min(timings['encode']),
+        'output_bytes': size
+    }
+
+
+def bench_product(segments, runs, **options):
+    """
+    Run segments through a MultiSegmentImage product and save it.
+    LRIT segments are JPEG bytes, HRIT segments are arrays decoded from JPEG 2000 (the external libjpeg decode is not timed).
+    HRIT products carry the same segments in every channel and are checked to add one catalogue row per saved file.
+    """
+
+    timings = {'add': [], 'save': []}
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-bench-")
+    downlink = options.get('downlink', "LRIT")
+    channels = options.get('channels', ("IR105",))
+
+    try:
+        for _ in range(runs):
+            config = pconfig("GK-2A", downlink, True, None, tmp, True, False, [], {}, options.get('pyramid', False), options.get('depth', 8), options.get('encoders', ("jpeg-max",)), False, 120, 512, False, False)
+            name = "IMG_FD_001_{}_20190722_000006_{:02d}." + downlink.lower()
+            product = products.new(config, name.format(channels[0], 1))
+
+            if downlink == "HRIT":
+                # Data field of each file is its segment index, decoded segment stands in for libjpeg output
+                product.convert_to_img = lambda path, fname, data: decoded_hrit(segments[int(data)], product.mode)
+
+            start = time.perf_counter()
+            for channel in channels:
+                for i, s in enumerate(segments):
+                    product.add(xrit_file(name.format(channel, i + 1), s if downlink == "LRIT" else str(i).encode()))
+            timings['add'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            product.save()
+            timings['save'].append(time.perf_counter() - start)
+
+        if downlink == "HRIT":
+            check_catalogue(product, tmp, channels)
+
+        return {
+            'add_s': min(timings['add']),
+            'save_s': min(timings['save']),
+            'decodes': product.decodes,
+            'segments': len(segments) * len(channels),
+            'output_bytes': sum(os.path.getsize(path) for path in product.saved),
+            'saved_s': product.encodes[0].saved
+        }
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def check_catalogue(product, output, channels):
+    """
+    Check a saved multi-channel product is catalogued with one row per channel and encoder preset, as the demuxer adds it
+    """
+
+    import archive
+
+    catalogue = archive.Archive(output)
+    catalogue.add_product(product)
+    for channel in channels:
+        _, total, _ = catalogue.query(channel=channel)
+        if total != len(product.config.encoders):
+            raise RuntimeError("{} catalogued {} times, expected {}".format(channel, total, len(product.config.encoders)))
+    catalogue.close()
+
+
+def bench_preview(segments, runs, scale=4):
+    """
+    Decode an assembled image at full size and as a reduced preview (JPEG draft mode)
+    """
+
+    imgs = [Image.open(io.BytesIO(s)) for s in segments]
+    canvas = Image.new("L", (imgs[0].size[0], imgs[0].size[1] * len(imgs)))
+    for i, img in enumerate(imgs):
+        canvas.paste(img, (0, img.size[1] * i))
+    buf = io.BytesIO()
+    canvas.save(buf, format='JPEG', quality=95)
+
+    timings = {'full': [], 'preview': []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        Image.open(io.BytesIO(buf.getvalue())).load()
+        timings['full'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        preview = products.open_preview(io.BytesIO(buf.getvalue()), canvas.size[0] // scale)
+        timings['preview'].append(time.perf_counter() - start)
+
+    return {
+        'full_s': min(timings['full']),
+        'preview_s': min(timings['preview']),
+        'preview_size': preview.size
+    }
+
+
+def products_benchmark(args):
+    """
+    Memory and encode time of multi-segment image products
+    """
+
+    segments = synthetic_segments()
+    results = {
+        'canvas': [bench_canvas(segments, mode, args.runs) for mode in ("RGB", "L")],
+        'product': bench_product(segments, args.runs),
+        'preview': bench_preview(segments, args.runs),
+        # LRIT segments are 220 lines (not a multiple of the 8 line JPEG MCU) so a lossless join needs MCU aligned segments
+        'concat': bench_product(synthetic_segments(height=224, last=184), args.runs, encoders=("jpeg-concat",))
+    }
+
+    print("{:<6} {:>14} {:>12} {:>12} {:>14}".format("MODE", "CANVAS BYTES", "ASSEMBLE", "ENCODE", "OUTPUT BYTES"))
+    for r in results['canvas']:
+        print("{:<6} {:>14} {:>11.3f}s {:>11.3f}s {:>14}".format(r['mode'], r['canvas_bytes'], r['assemble_s'], r['encode_s'], r['output_bytes']))
+
+    p = results['product']
+    print("\nPRODUCT  add {:.3f}s  save {:.3f}s  output {} bytes  {} decodes of {} segments".format(p['add_s'], p['save_s'], p['output_bytes'], p['decodes'], p['segments']))
+
+    p = results['concat']
+    print("CONCAT   add {:.3f}s  save {:.3f}s  output {} bytes  {:.3f}s saved by lossless join".format(p['add_s'], p['save_s'], p['output_bytes'], p['saved_s'] or 0))
+
+    p = results['preview']
+    print("PREVIEW  full decode {:.3f}s  {}x{} draft decode {:.3f}s".format(p['full_s'], *p['preview_size'], p['preview_s']))
+
+    return results
+
+
+def serve_dashboard(port, threads, ready, stop):
+    """
+    Run dashboard backed by an idle demuxer until stop is set (runs in a separate process)
+    """
+
+    import dash
+    import demuxer
+
+    # Dashboard serves static files relative to the xrit-rx folder
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-bench-")
+
+    demux = demuxer.Demuxer(pconfig("GK-2A", "LRIT", False, None, tmp, True, False, [], {}, False, 8, ("jpeg-max",), False, 120, 512, False, False))
+    # No rate limits, every benchmark client shares one address
+    server = dash.Dashboard(dconfig(port, 1, "GK-2A", "LRIT", tmp, True, False, [], "benchmark", threads, 64 * 1024 * 1024, 256, {}, False), demux)
+    ready.set()
+
+    stop.wait()
+    server.stop()
+    demux.stop()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+def poller(url, paths, deadline, keepalive, results):
+    """
+    Poll dashboard API endpoints until deadline, over one keep-alive connection or a new connection per request
+    """
+
+    latencies = []
+    errors = 0
+    connections = 0
+    received = 0
+    headers = {'Accept-Encoding': "gzip"}
+    if not keepalive:
+        headers['Connection'] = "close"
+
+    conn = None
+    i = 0
+    while time.perf_counter() < deadline:
+        path = url.path.rstrip("/") + paths[i % len(paths)]
+        i += 1
+
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+                conn.connect()
+                connections += 1
+            
+            conn.request("GET", path, headers=headers)
+            res = conn.getresponse()
+            body = res.read()
+            if res.status >= 500:
+                raise http.client.HTTPException(res.status)
+            
+            latencies.append(time.perf_counter() - start)
+            received += len(body)
+            if not keepalive or res.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            if conn is not None:
+                conn.close()
+            conn = None
+    
+    if conn is not None:
+        conn.close()
+    results.append((latencies, errors, connections, received))
+
+
+def http_phase(url, paths, clients, duration, keepalive):
+    """
+    Run polling clients for one connection mode and summarise their requests
+    """
+
+    results = []
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=poller, args=(url, paths, deadline, keepalive, results)) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for r in results for l in r[0])
+    connections = sum(r[2] for r in results)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0
+
+    return {
+        'mode': "keep-alive" if keepalive else "close",
+        'duration_s': elapsed,
+        'requests': len(latencies),
+        'errors': sum(r[1] for r in results),
+        'connections': connections,
+        'requests_per_connection': len(latencies) / connections if connections else 0,
+        'bytes_per_response': sum(r[3] for r in results) / len(latencies) if latencies else 0,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': pct(0.50),
+        'p99_ms': pct(0.99),
+        'max_ms': latencies[-1] * 1000 if latencies else 0
+    }
+
+
+def http_benchmark(args):
+    """
+    Connection churn, requests per second and latency of dashboard API polling by concurrent clients,
+    with keep-alive connections and with a new connection per request
+    """
+
+    server = None
+    if args.url is None:
+        # Start dashboard in its own process so clients do not share its interpreter
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        
+        ready = multiprocessing.Event()
+        stop = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve_dashboard, args=(port, args.threads, ready, stop))
+        server.start()
+        ready.wait(30)
+        args.url = "http://127.0.0.1:{}".format(port)
+    
+    url = urllib.parse.urlsplit(args.url)
+    paths = args.paths.split(",") if args.paths else POLL_PATHS
+
+    try:
+        phases = [http_phase(url, paths, args.clients, args.duration, keepalive) for keepalive in (True, False)]
+    finally:
+        if server is not None:
+            stop.set()
+            server.join(30)
+    
+    print("{} clients for {:.1f}s per mode against {}".format(args.clients, args.duration, args.url))
+    print("{:<11} {:>9} {:>7} {:>12} {:>9} {:>9} {:>10} {:>10} {:>10}".format("MODE", "REQUESTS", "ERRORS", "CONNECTIONS", "REQ/CONN", "REQ/S", "P50", "P99", "MAX"))
+    for r in phases:
+        print("{:<11} {:>9} {:>7} {:>12} {:>9.1f} {:>9.0f} {:>7.2f} ms {:>7.2f} ms {:>7.2f} ms".format(
+            r['mode'], r['requests'], r['errors'], r['connections'], r['requests_per_connection'], r['rps'], r['p50_ms'], r['p99_ms'], r['max_ms']
+        ))
+
+    return {
+        'url': args.url,
+        'clients': args.clients,
+        'paths': paths,
+        'phases': phases
+    }
+
+
+def dispatch_benchmark(args):
+    """
+    Time spent routing API requests and building responses in the request handler, without sockets
+    """
+
+    import dash
+    import demuxer
+
+    # Dashboard serves static files relative to the xrit-rx folder
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-bench-")
+    paths = args.paths.split(",") if args.paths else DISPATCH_PATHS
+
+    demux = demuxer.Demuxer(pconfig("GK-2A", "LRIT", False, None, tmp, True, False, [], {}, False, 8, ("jpeg-max",), False, 120, 512, False, False))
+    server = dash.Dashboard(dconfig(0, 1, "GK-2A", "LRIT", tmp, True, False, [], "benchmark", 1, 64 * 1024 * 1024, 256, {}, False), demux)
+    handler = dash.Handler.__new__(dash.Handler)     # Handler without a connection, only handle_api is called
+    iterations = 20000
+
+    results = []
+    try:
+        for path in paths:
+            best = None
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    handler.handle_api(path)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            status = handler.handle_api(path)[1]
+            results.append({'path': path, 'status': status, 'us': best / iterations * 1e6, 'rps': iterations / best})
+    finally:
+        server.stop()
+        demux.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.chdir(cwd)
+
+    print("{:<40} {:>7} {:>10} {:>12}".format("PATH", "STATUS", "TIME", "REQ/S"))
+    for r in results:
+        print("{:<40} {:>7} {:>7.2f} us {:>12.0f}".format(r['path'], r['status'], r['us'], r['rps']))
+
+    return {
+        'iterations': iterations,
+        'paths': results
+    }
+
+
+class SyntheticStream:
+    """
+    Writes a GK-2A VCDU stream of xRIT files to a file, with fill VCDUs between files and randomly dropped VCDUs
+    """
+
+    def __init__(self, f, fill=0.0, loss=0.0, seed=0):
+        self.f = f
+        self.fill = fill                # Fraction of VCDUs that are fill
+        self.loss = loss                # Fraction of VCDUs dropped
+        self.rng = random.Random(seed)
+        self.counters = {}              # VCDU continuity counter by VCID
+        self.vcdus = 0                  # VCDUs in stream (including dropped VCDUs)
+        self.fill_vcdus = 0             # Fill VCDUs in stream
+        self.dropped = 0                # VCDUs dropped from stream
+
+    def vcdu(self, vcid, mpdu):
+        """
+        Add VCDU to stream (unless it is dropped)
+        """
+
+        counter = self.counters.get(vcid, 0)
+        self.counters[vcid] = (counter + 1) & 0xFFFFFF
+        self.vcdus += 1
+
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+
+        # Version 1, spacecraft ID 195 (GK-2A), VCID, counter, no replay flag
+        header = (1 << 46) | (195 << 38) | (vcid << 32) | (counter << 8)
+        self.f.write(header.to_bytes(6, "big") + mpdu)
+
+    def fill_to(self, data_vcdus):
+        """
+        Add fill VCDUs so fill makes up the configured fraction of the stream
+        """
+
+        count = round(data_vcdus * self.fill / (1 - self.fill)) if self.fill else 0
+        for _ in range(count):
+            self.vcdu(63, b'\x07\xff' + bytes(MPDU_DATA_LEN))
+        self.fill_vcdus += count
+
+    def file(self, vcid, apid, counter, spdu):
+        """
+        Add S_PDU as a TP_File split into CP_PDUs, packed into M_PDUs starting at a new VCDU
+
+        Returns:
+            int -- Data VCDUs in file
+        """
+
+        tp = counter.to_bytes(2, "big") + (len(spdu) * 8).to_bytes(8, "big") + spdu
+
+        # First and last CP_PDU sequence flags, so files always have at least two CP_PDUs
+        count = max(2, -(-len(tp) // 8190))
+        size = -(-len(tp) // count)
+        pdus = []
+        for i, offset in enumerate(range(0, len(tp), size)):
+            part = tp[offset:offset + size]
+            seq = 1 if i == 0 else 2 if offset + size >= len(tp) else 0
+            payload = part + binascii.crc_hqx(part, 0xFFFF).to_bytes(2, "big")
+            header = ((apid & 0x7FF) << 32) | (seq << 30) | ((i & 0x3FFF) << 16) | (len(payload) - 1)
+            pdus.append(header.to_bytes(6, "big") + payload)
+        pdus.append(bytes(7))           # EOF marker CP_PDU
+
+        # First header pointer of each M_PDU is the offset of the first CP_PDU starting in it (2047 if none)
+        starts = []
+        offset = 0
+        for pdu in pdus:
+            starts.append(offset)
+            offset += len(pdu)
+        
+        data = b"".join(pdus)
+        packets = 0
+        for offset in range(0, len(data), MPDU_DATA_LEN):
+            pointer = next((s - offset for s in starts if offset <= s < offset + MPDU_DATA_LEN), 2047)
+            packet = data[offset:offset + MPDU_DATA_LEN]
+            self.vcdu(vcid, pointer.to_bytes(2, "big") + packet + bytes(MPDU_DATA_LEN - len(packet)))
+            packets += 1
+        
+        return packets
+
+
+def build_xrit(name, data, index=b'\x00\x00', key=None):
+    """
+    Build S_PDU of an xRIT file with primary, key and annotation headers (data field encrypted if a key is given)
+    """
+
+    if key is not None:
+        data += bytes(-len(data) % 8)
+        data = DES.new(key, DES.MODE_ECB).encrypt(data)
+
+    key_header = b'\x07\x00\x07\x00\x00' + index
+    annotation = b'\x04' + (3 + len(name)).to_bytes(2, "big") + name.encode()
+    total = 16 + len(key_header) + len(annotation)
+    primary = b'\x00\x00\x10\x00' + total.to_bytes(4, "big") + (len(data) * 8).to_bytes(8, "big")
+
+    return primary + key_header + annotation + data
+
+
+def synthetic_stream(path, scenario, count):
+    """
+    Write synthetic stream of a scenario to a file.
+    LRIT streams carry 10 segment Full Disk images (JPEG segments, decoded and encoded by the product pipeline).
+    HRIT Full Disk segments are JPEG 2000 and need the external libjpeg tool, so HRIT streams carry
+    single segment files of HRIT segment size instead (demultiplexed, decrypted and written at HRIT volume).
+
+    Returns:
+        dict -- Stream statistics
+    """
+
+    index, key = (BENCH_KEY_INDEX, BENCH_KEY) if scenario.encrypted else (b'\x00\x00', None)
+    segments = synthetic_segments() if scenario.downlink == "LRIT" else None
+    rng = np.random.default_rng(0)
+
+    with open(path, "wb") as f:
+        stream = SyntheticStream(f, scenario.fill, scenario.loss)
+        files = 0
+        for seq in range(1, count + 1):
+            stamp = "20190722_{:02d}{:02d}06".format(seq // 6 % 24, seq % 6 * 10)
+            for num in range(1, 11):
+                if segments is not None:
+                    name = "IMG_FD_{:03d}_IR105_{}_{:02d}.lrit".format(seq, stamp, num)
+                    data = segments[num - 1]
+                else:
+                    name = "ADD_BENCH_{:03d}_{}_{:02d}.hrit".format(seq * 10 + num, stamp, num)
+                    data = rng.integers(0, 256, HRIT_SEGMENT_BYTES, dtype=np.uint8).tobytes()
+                
+                packets = stream.file(0, 0, files, build_xrit(name, data, index, key))
+                stream.fill_to(packets)
+                files += 1
+        
+        # Fill VCDU at end of stream (finishes processing of last file on channel change)
+        stream.vcdu(63, b'\x07\xff' + bytes(MPDU_DATA_LEN))
+
+    return {
+        'files': files,
+        'vcdus': stream.vcdus,
+        'fill_vcdus': stream.fill_vcdus + 1,
+        'dropped_vcdus': stream.dropped
+    }
+
+
+def load_keys(path):
+    """
+    Load decryption keys from a decrypted key file (as used by xrit-rx)
+    """
+
+    with open(path, "rb") as f:
+        fbytes = f.read()
+
+    keys = {}
+    for i in range(int.from_bytes(fbytes[:2], byteorder="big")):
+        offset = i * 10 + 2
+        keys[fbytes[offset:offset + 2]] = fbytes[offset + 2:offset + 10]
+    
+    return keys
+
+
+def thread_cpu():
+    """
+    CPU seconds used by live threads by name (worker pools are summed, empty where per-thread clocks are unavailable)
+    """
+
+    cpu = {}
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return cpu
+    
+    for t in threading.enumerate():
+        try:
+            seconds = time.clock_gettime(time.pthread_getcpuclockid(t.ident))
+        except OSError:
+            continue
+        name = re.sub(r"_\d+$", "", t.name)
+        cpu[name] = cpu.get(name, 0.0) + seconds
+    
+    return cpu
+
+
+def run_stream(path, downlink, keys, results):
+    """
+    Feed VCDU stream file through a demuxer with the default xrit-rx output settings (runs in a separate process)
+    """
+
+    import demuxer
+    import metrics
+    import tracing
+
+    # Console output is still produced, but not shown
+    sys.stdout = open(os.devnull, "w")
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-bench-")
+
+    try:
+        # Captures without keys are demultiplexed to xRIT files only, as xrit-rx does without a key file
+        images = bool(keys)
+        demux = demuxer.Demuxer(pconfig("GK-2A", downlink, False, None, tmp, images, not images, [], keys, True, 8, ("jpeg-max",), True, 120, 512, True, True))
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = usage.ru_utime + usage.ru_stime
+        start = time.perf_counter()
+
+        with open(path, "rb") as f:
+            while True:
+                packet = f.read(VCDU_LEN)
+                if not packet:
+                    break
+                while len(demux.rxq) >= PIPELINE_QUEUE:
+                    time.sleep(0.001)
+                demux.push(packet)
+        
+        while not demux.complete():
+            time.sleep(0.001)
+        demux.flush()
+
+        elapsed = time.perf_counter() - start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        threads = thread_cpu()
+        demux.stop()
+
+        total = lambda metric: sum(metric.values.values())
+        outcomes = {}
+        for (_, outcome), n in metrics.PRODUCTS.values.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + n
+        
+        results.put({
+            'seconds': elapsed,
+            'cpu_s': usage.ru_utime + usage.ru_stime - cpu,
+            'thread_cpu_s': {name: round(threads[name], 3) for name in ("MainThread", "DEMUX CORE", "ENCODER") if name in threads},
+            'stage_s': {stage: seconds for (stage,), (_, seconds) in tracing.STAGES.values.items() if stage in PIPELINE_STAGES},
+            'tp_files': total(metrics.TP_FILES),
+            'cppdu_errors': total(metrics.CP_PDU_ERRORS),
+            'tp_file_errors': total(metrics.TP_FILE_ERRORS),
+            'products': outcomes.get('complete', 0) + outcomes.get('partial', 0),
+            'dropped_products': outcomes.get('dropped', 0),
+            'peak_rss_bytes': peak_rss()
+        })
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_stream(path, downlink, keys, runs):
+    """
+    Run a VCDU stream file through the pipeline in a new process per run (fresh metrics and peak RSS), keeping the fastest run
+    """
+
+    best = None
+    for _ in range(runs):
+        results = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run_stream, args=(path, downlink, keys, results))
+        proc.start()
+        while True:
+            try:
+                result = results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError("Pipeline benchmark process exited without results ({})".format(path))
+        proc.join()
+
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    
+    vcdus = os.path.getsize(path) // VCDU_LEN
+    best['vcdus'] = vcdus
+    best['vcdus_per_s'] = vcdus / best['seconds']
+    best['products_per_s'] = best['products'] / best['seconds']
+    return best
+
+
+def pipeline_benchmark(args):
+    """
+    VCDU throughput, CPU time by stage, peak memory and product rate of the demuxer and product pipeline
+    on recorded captures and synthetic streams
+    """
+
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    captures = args.captures.split(",") if args.captures else [SAMPLE_CAPTURE] if os.path.isfile(SAMPLE_CAPTURE) else []
+    keys = load_keys(args.keys) if args.keys else {}
+    tmp = tempfile.mkdtemp(prefix="xrit-rx-bench-")
+
+    results = []
+    try:
+        for capture in captures:
+            result = bench_stream(capture, "LRIT", keys, args.runs)
+            results.append(dict({'name': "recorded", 'stream': os.path.basename(capture), 'downlink': "LRIT", 'encrypted': None, 'keys': bool(keys)}, **result))
+        
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            path = os.path.join(tmp, name + ".bin")
+            stream = synthetic_stream(path, scenario, args.products)
+            result = bench_stream(path, scenario.downlink, {BENCH_KEY_INDEX: BENCH_KEY}, args.runs)
+            results.append(dict({'name': name, 'stream': stream, 'downlink': scenario.downlink, 'encrypted': scenario.encrypted, 'keys': True}, **result))
+            os.remove(path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # Product pipeline at HRIT size (synthetic HRIT streams carry no image products)
+    segments = synthetic_hrit_segments()
+    images = []
+    for name, (depth, presets) in HRIT_PRODUCTS.items():
+        result = bench_product(segments, args.runs, downlink="HRIT", depth=depth, encoders=presets, channels=HRIT_CHANNELS)
+        images.append(dict({'name': name, 'depth': depth, 'encoders': presets}, **result))
+
+    print("{:<16} {:>8} {:>9} {:>10} {:>7} {:>9} {:>7} {:>8} {:>11}".format("STREAM", "VCDUS", "TIME", "VCDU/S", "FILES", "PRODUCTS", "PROD/S", "CPU", "PEAK RSS"))
+    for r in results:
+        print("{:<16} {:>8} {:>8.2f}s {:>10.0f} {:>7} {:>9} {:>7.2f} {:>7.2f}s {:>8.1f} MB".format(
+            r['name'], r['vcdus'], r['seconds'], r['vcdus_per_s'], r['tp_files'], r['products'], r['products_per_s'], r['cpu_s'], r['peak_rss_bytes'] / 1024 / 1024
+        ))
+    
+    print("\n{:<16} ".format("CPU BY STAGE") + " ".join("{:>10}".format(s.upper()) for s in PIPELINE_STAGES) + " {:>11} {:>9}".format("DEMUX CORE", "ENCODER"))
+    for r in results:
+        stages = " ".join("{:>9.3f}s".format(r['stage_s'].get(s, 0)) for s in PIPELINE_STAGES)
+        threads = " {:>10.3f}s {:>8.3f}s".format(r['thread_cpu_s'].get("DEMUX CORE", 0), r['thread_cpu_s'].get("ENCODER", 0))
+        print("{:<16} ".format(r['name']) + stages + threads)
+    
+    # Streams that produce no images only measure demultiplexing, decryption and file writes
+    print("\nHRIT streams carry single segment files: demultiplexing, decryption and writes only, no image decode or encode")
+    if any(r['name'] == "recorded" and not r['keys'] for r in results):
+        print("Recorded captures without --keys are demultiplexed to xRIT files only")
+    
+    print("\n{:<16} {:>6} {:>14} {:>9} {:>9} {:>13}".format("HRIT PRODUCT", "DEPTH", "ENCODERS", "ADD", "SAVE", "OUTPUT BYTES"))
+    for r in images:
+        print("{:<16} {:>6} {:>14} {:>8.3f}s {:>8.3f}s {:>13}".format(r['name'], r['depth'], ",".join(r['encoders']), r['add_s'], r['save_s'], r['output_bytes']))
+    print("{} channel, {} segment 2750x2750 Full Disk from decoded segments (add is canvas paste, save is encode and write, JPEG 2000 decode not included)".format(len(HRIT_CHANNELS), len(segments)))
+
+    return {
+        'products_per_stream': args.products,
+        'streams': results,
+        'hrit_products': images
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmarks for the xrit-rx processing pipeline")
+    argparser.add_argument("BENCHMARK", action="store", choices=["products", "http", "dispatch", "pipeline"], help="Benchmark to run")
+    argparser.add_argument("--runs", action="store", type=int, help="Repetitions per measurement (best run is reported)", default=3)
+    argparser.add_argument("--url", action="store", help="Dashboard to load test (default: start a local dashboard)", default=None)
+    argparser.add_argument("--clients", action="store", type=int, help="Concurrent polling clients for HTTP benchmark", default=50)
+    argparser.add_argument("--duration", action="store", type=float, help="Seconds to run each HTTP benchmark mode for", default=10)
+    argparser.add_argument("--paths", action="store", help="Comma separated API paths polled by HTTP benchmark or timed by dispatch benchmark (default: dashboard polling endpoints)", default=None)
+    argparser.add_argument("--threads", action="store", type=int, help="Worker threads of local dashboard", default=64)
+    argparser.add_argument("--scenarios", action="store", help="Comma separated synthetic streams run by pipeline benchmark (default: {})".format(", ".join(SCENARIOS)), default=None)
+    argparser.add_argument("--captures", action="store", help="Comma separated recorded VCDU files run by pipeline benchmark (default: sample capture)", default=None)
+    argparser.add_argument("--keys", action="store", help="Decrypted key file for recorded captures (without keys captures are demultiplexed to xRIT files only)", default=None)
+    argparser.add_argument("--products", action="store", type=int, help="Products (10 files each) per synthetic stream", default=3)
+    argparser.add_argument("--json", action="store", help="Save results to JSON file", default=None)
+    args = argparser.parse_args()
+
+    benchmarks = {
+        "products": products_benchmark,
+        "http": http_benchmark,
+        "dispatch": dispatch_benchmark,
+        "pipeline": pipeline_benchmark
+    }
+
+    results = {
+        'benchmark': args.BENCHMARK,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'results': benchmarks[args.BENCHMARK](args)
+    }
+    results['peak_rss_bytes'] = peak_rss()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print("\nSaved results to \"{}\"".format(args.json))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,10 @@
 import os
 import sys
 import glob
+import json
+import sqlite3
 import subprocess
+import calendar
 import datetime
 from pathlib import Path
 import argparse
@@ -47,19 +50,7 @@ def find_images(received_path, hours_back=24, image_type="FD"):
         all_images = list(set(image_files + yesterday_images))
         
         # Sort by timestamp
-        def get_timestamp(filepath):
-            try:
-                filename = os.path.basename(filepath)
-                parts = filename.split('_')
-                if len(parts) >= 6:
-                    date_part = parts[4]  # 20250810
-                    time_part = parts[5].split('.')[0]  # 075006
-                    return datetime.datetime.strptime(f"{date_part}_{time_part}", "%Y%m%d_%H%M%S")
-            except:
-                pass
-            return datetime.datetime.min
-        
-        all_images.sort(key=get_timestamp)
+        all_images.sort(key=_get_timestamp)
         
         # Take the most recent images (up to 2 per hour requested)
         max_images = min(len(all_images), hours_back * 2)
@@ -70,14 +61,59 @@ def find_images(received_path, hours_back=24, image_type="FD"):
     return image_files
 
 
+def _get_timestamp(filepath):
+    """
+    Get observation time from an image file name (datetime.min if the name has none)
+    """
+    try:
+        filename = os.path.basename(filepath)
+        parts = filename.split('_')
+        if len(parts) >= 6:
+            date_part = parts[4]  # 20250810
+            time_part = parts[5].split('.')[0]  # 075006
+            return datetime.datetime.strptime(f"{date_part}_{time_part}", "%Y%m%d_%H%M%S")
+    except:
+        pass
+    return datetime.datetime.min
+
+
+def _get_downlink_paths(received_path):
+    """
+    Get downlink folders (LRIT, HRIT) holding received images.
+    received_path is the xrit-rx output root, or a downlink folder itself.
+    """
+    if os.path.basename(os.path.normpath(received_path)) in ("LRIT", "HRIT"):
+        return [received_path]
+
+    return [p for p in (os.path.join(received_path, d) for d in ("LRIT", "HRIT")) if os.path.isdir(p)]
+
+
 def _search_images_in_timeframe(received_path, start_time, end_time, image_type):
     """
     Search for images within a specific timeframe
     """
     image_files = []
+
+    for downlink_path in _get_downlink_paths(received_path):
+        # Query the archive catalogue written by xrit-rx instead of scanning folders when it is usable
+        images = _query_archive(downlink_path, start_time, end_time, image_type)
+        if images is None:
+            images = _scan_folders(downlink_path, start_time, end_time, image_type)
+        image_files += [(_get_timestamp(f), f) for f in images]
+
+    # Sort by timestamp and return just the file paths
+    image_files.sort(key=lambda x: x[0])
+    return [f[1] for f in image_files]
+
+
+def _scan_folders(downlink_path, start_time, end_time, image_type):
+    """
+    Find IR105 images within a specific timeframe by scanning the date folders of a downlink
+    """
+    image_files = []
     
     # Search through date directories
-    for date_dir in glob.glob(os.path.join(received_path, "LRIT", "*")):
+    for date_dir in glob.glob(os.path.join(downlink_path, "*")):
         if not os.path.isdir(date_dir):
             continue
             
@@ -122,6 +158,81 @@ def _search_images_in_timeframe(received_path, start_time, end_time, image_type)
     return [f[1] for f in image_files]
 
 
+def _query_archive(downlink_path, start_time, end_time, image_type):
+    """
+    Find IR105 images within a specific timeframe in the xrit-rx archive catalogue of a downlink
+
+    Returns None if there is no catalogue, it can not be read, it has no matching images
+    or it is behind the newest date folder (archive turned off since, or first scan still running)
+    """
+    db_path = os.path.join(downlink_path, "archive.db")
+    if not os.path.isfile(db_path):
+        return None
+    
+    try:
+        dates = [d for d in os.listdir(downlink_path) if len(d) == 8 and d.isdigit()]
+    except OSError:
+        dates = []
+
+    # Catalogue times are file name times in seconds, compared like file names are when scanning folders
+    start = calendar.timegm(start_time.timetuple())
+    end = calendar.timegm(end_time.timetuple())
+
+    try:
+        db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            newest = db.execute("SELECT MAX(time) FROM images").fetchone()[0]
+            rows = db.execute(
+                "SELECT path FROM images WHERE type = ? AND channel = 'IR105' AND time BETWEEN ? AND ? ORDER BY time",
+                (image_type, start, end)
+            ).fetchall()
+        finally:
+            db.close()
+    except sqlite3.Error:
+        return None
+
+    # Catalogue missing images of the newest date folder is stale
+    if dates and (newest is None or datetime.datetime.fromtimestamp(newest, datetime.timezone.utc).strftime("%Y%m%d") < max(dates)):
+        return None
+
+    # Catalogue paths are relative to where xrit-rx runs, rebuild them under the downlink folder
+    image_files = []
+    for (path,) in rows:
+        parts = path.replace("\\", "/").split("/")
+        image_file = os.path.join(downlink_path, *parts[-3:])
+        if image_file.endswith(".jpg") and os.path.isfile(image_file):
+            image_files.append(image_file)
+
+    return image_files or None
+
+
+def _get_level(image_file, width):
+    """
+    Get the smallest pyramid level of an image at least `width` pixels wide
+
+    Returns None if the image has no level manifest (saved before pyramids were enabled)
+    """
+    stem = os.path.splitext(os.path.basename(image_file))[0]
+    manifest_path = os.path.join(os.path.dirname(image_file), "pyramid", stem + ".json")
+
+    try:
+        with open(manifest_path, "r") as f:
+            levels = json.load(f)['levels']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # Levels are stored largest first, reduced levels are kept next to the manifest
+    best = None
+    for level in levels[1:]:
+        if level['width'] < width:
+            break
+        level_path = os.path.join(os.path.dirname(manifest_path), os.path.basename(level['path']))
+        if os.path.exists(level_path):
+            best = level_path
+    
+    return best
+
+
 def create_timelapse(image_files, output_path, format_type="mp4", framerate=10):
     """
     Create timelapse video or GIF from image files
@@ -140,6 +251,13 @@ def create_timelapse(image_files, output_path, format_type="mp4", framerate=10):
         return False
     
     print(f"Creating {format_type.upper()} timelapse from {len(image_files)} images...")
+
+    # GIFs are scaled down to 640px wide, so use reduced resolution levels when every frame has one
+    if format_type.lower() == "gif":
+        levels = [_get_level(f, 640) for f in image_files]
+        if all(levels):
+            print("Using reduced resolution image levels for GIF frames")
+            image_files = levels
     
     # Create temporary file list for FFmpeg
     temp_dir = "/tmp/timelapse"
@@ -12,15 +12,17 @@ import threading
 
 
 class TimelapseService:
-    def __init__(self, received_dir="received", check_interval=300):
+    def __init__(self, received_dir="received", check_interval=300, notify_fd=None):
         """
         Initialize timelapse service
         
         Args:
             received_dir: Path to received images directory
             check_interval: Seconds between file checks (default: 5 minutes)
+            notify_fd: Pipe file descriptor that finished timelapse names are written to (default: none)
         """
         self.received_dir = received_dir
+        self.notify_fd = notify_fd
         # Change timelapses to be sibling directory to received
         self.output_dir = os.path.join(os.path.dirname(received_dir), "timelapses")
         self.check_interval = check_interval
@@ -185,6 +187,7 @@ class TimelapseService:
             if result.returncode == 0:
                 self.logger.info(f"✓ {hours}h {format_type.upper()} timelapse completed: {output_file}")
                 self.last_generation[f"{hours}h_{format_type}"] = datetime.datetime.now()
+                self.notify(output_file)
                 return True
             else:
                 error_msg = result.stderr or result.stdout or f"Process exited with code {result.returncode}"
@@ -207,6 +210,19 @@ class TimelapseService:
             self.logger.error(f"✗ {hours}h {format_type.upper()} timelapse error: {e}")
             return False
     
+    def notify(self, output_file):
+        """
+        Tell xrit-rx a timelapse has finished so the dashboard can be updated
+        """
+        if self.notify_fd is None:
+            return
+        
+        try:
+            os.write(self.notify_fd, (os.path.basename(output_file) + "\n").encode("utf-8"))
+        except OSError as e:
+            self.logger.warning(f"Could not notify xrit-rx of new timelapse: {e}")
+            self.notify_fd = None
+    
     def generate_all_timelapses(self):
         """
         Generate all timelapse variants if needed
@@ -342,6 +358,7 @@ def main():
     parser.add_argument("--test", action="store_true", help="Run a single test timelapse generation")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     parser.add_argument("--status", action="store_true", help="Show service status and schedule info")
+    parser.add_argument("--notify-fd", type=int, default=None, help="Pipe file descriptor to write finished timelapse names to")
     
     args = parser.parse_args()
     
@@ -349,7 +366,7 @@ def main():
     if args.debug:
         logging.basicConfig(level=logging.DEBUG, force=True)
     
-    service = TimelapseService(args.received)
+    service = TimelapseService(args.received, notify_fd=args.notify_fd)
     
     if args.status:
         print("=== Timelapse Service Status ===")
@@ -0,0 +1,165 @@
+"""
+tracing.py
+https://github.com/Zalgar/xrit-rx-docker
+
+Per-product stage timing from VCDU arrival to image on disk
+"""
+
+from collections import deque, namedtuple
+from datetime import datetime, timezone
+import json
+import os
+from threading import Lock
+import time
+
+import metrics
+
+
+LOG_NAME = "traces.jsonl"       # Trace log file name (in demuxer output folder)
+LOG_MAX_SIZE = 10 * 1024 * 1024 # Trace log is rotated to traces.jsonl.1 beyond this size (bytes)
+RECENT_SIZE = 200               # Trace records kept in memory for the dashboard API
+PAGE_SIZE = 20                  # Trace records returned by the dashboard API when no limit is given
+
+# Arrival of a completed segment (wall clock times, decrypt in seconds)
+Segment = namedtuple("Segment", "first_vcdu last_vcdu dequeued tp_file decrypt")
+
+# Stages timed for each segment, then for each product as it is saved
+SEGMENT_STAGES = ("receive", "queue", "reassembly", "decrypt", "decode", "canvas")
+PRODUCT_STAGES = ("encode", "write")
+
+# Name of the timestamp marking the end of a stage (other stages are marked by their own name)
+STAGE_MARKS = {
+    'receive':      'last_vcdu',
+    'queue':        'dequeued',
+    'reassembly':   'tp_file'
+}
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)
+STAGES = metrics.Histogram("xrit_stage_seconds", "Time spent in each pipeline stage (per segment for receive to canvas, per product for encode and write)", ("stage",), STAGE_BUCKETS)
+
+recent = deque(maxlen=RECENT_SIZE)  # Latest trace records, oldest first
+log_path = None                     # Trace log path (None when the log is disabled)
+log_lock = Lock()
+
+
+def configure(output, log):
+    """
+    Set trace log location
+
+    Arguments:
+        output {string} -- Demuxer output path
+        log {bool} -- Write trace records to the log file
+    """
+
+    global log_path
+
+    log_path = os.path.join(output, LOG_NAME) if log else None
+
+
+class Trace:
+    """
+    Stage timestamps and durations of one product.
+    Timestamps are when each stage last finished (wall clock), durations are totals over every segment.
+    """
+
+    def __init__(self):
+        self.times = {}                 # Wall clock time each stage last finished (first VCDU, then by STAGE_MARKS name)
+        self.durations = {}             # Total seconds spent in each stage
+        self.segments = 0               # Segments traced (segments restored from checkpoint are not)
+
+    def add(self, stage, duration, mark=None):
+        """
+        Add time spent in a stage
+
+        Arguments:
+            stage {string} -- Stage name
+            duration {float} -- Seconds spent in stage
+            mark {float} -- When the stage finished (default: now)
+        """
+
+        self.durations[stage] = self.durations.get(stage, 0.0) + duration
+        self.times[STAGE_MARKS.get(stage, stage)] = time.time() if mark is None else mark
+        STAGES.observe(duration, stage)
+
+    def segment(self, seg):
+        """
+        Add timing of a segment that has been received, reassembled and decrypted
+        """
+
+        self.segments += 1
+        self.times.setdefault('first_vcdu', seg.first_vcdu)
+        self.add('receive', seg.last_vcdu - seg.first_vcdu, seg.last_vcdu)
+        self.add('queue', seg.dequeued - seg.last_vcdu, seg.dequeued)
+        self.add('reassembly', seg.tp_file - seg.dequeued, seg.tp_file)
+        self.add('decrypt', seg.decrypt, seg.tp_file + seg.decrypt)
+
+    def finish(self, product, path):
+        """
+        Build trace record of a saved product, keep it for the API and append it to the trace log
+        """
+
+        first = self.times.get('first_vcdu', product.start_time)
+        end = self.times.get('write', time.time())
+
+        record = {
+            'product': product.name.full,
+            'type': product.name.mode,
+            'path': path,
+            'segments': self.segments,
+            'times': {s: iso_time(t) for s, t in self.times.items()},
+            'durations': {s: round(self.durations[s], 6) for s in SEGMENT_STAGES + PRODUCT_STAGES if s in self.durations},
+            'total': round(end - first, 3)
+        }
+        recent.append(record)
+
+        if log_path is not None:
+            write_log(record)
+
+        return record
+
+
+def iso_time(t):
+    """
+    Format wall clock time as ISO 8601 UTC with milliseconds
+    """
+
+    return datetime.fromtimestamp(t, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def write_log(record):
+    """
+    Append trace record to log file, rotating it once it is over LOG_MAX_SIZE
+    """
+
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with log_lock:
+        try:
+            if os.path.getsize(log_path) > LOG_MAX_SIZE:
+                os.replace(log_path, log_path + ".1")
+        except OSError:
+            pass
+
+        try:
+            with open(log_path, "a") as f:
+                f.write(line)
+        except OSError:
+            pass
+
+
+def query(image_type=None, limit=PAGE_SIZE):
+    """
+    Latest trace records, newest first
+
+    Arguments:
+        image_type {string} -- Only products of this type (e.g. FD)
+        limit {int} -- Maximum number of records
+    """
+
+    records = []
+    for record in reversed(list(recent)):
+        if image_type is None or record['type'] == image_type:
+            records.append(record)
+            if len(records) == limit:
+                break
+
+    return records
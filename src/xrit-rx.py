@@ -18,6 +18,7 @@ import json
 import logging
 from os import mkdir, path, makedirs
 import os
+import signal
 import socket
 from time import time, sleep
 import subprocess
@@ -25,7 +26,10 @@ from threading import Thread
 
 from demuxer import Demuxer
 import ccsds as CCSDS
+import encoders
 from dash import Dashboard
+import profiler
+import ratelimit
 
 
 # Globals
@@ -38,6 +42,14 @@ downlink = None         # Downlink type (LRIT/HRIT)
 output = None           # Output path root
 output_images = None    # Flag for saving Images to disk
 output_xrit = None      # Flag for saving xRIT files to disk
+output_pyramid = None   # Flag for saving reduced resolution image levels
+output_depth = None     # Bit depth of HRIT image products (8 or 16)
+output_encoders = None  # Encoder presets for image products (first is primary output)
+output_checkpoint = None  # Flag for checkpointing segments of in-flight products
+product_timeout = None  # Seconds without new segments before a product is finalised
+product_memory = None   # Memory budget for products being assembled per channel (MB)
+output_archive = None   # Flag for cataloguing saved images in an SQLite archive index
+output_trace_log = None # Flag for appending per-product stage timings to traces.jsonl
 blacklist = []          # VCID blacklist
 packetf = None          # Packet file object
 keypath = None          # Decryption key file path
@@ -50,6 +62,11 @@ timelapse_process = None  # Timelapse service process
 dashe = None            # Dashboard enabled flag
 dashp = None            # Dashboard HTTP port
 dashi = None            # Dashboard update interval
+dasht = None            # Dashboard HTTP worker threads
+dashc = None            # Dashboard resized image cache size (bytes)
+dashm = None            # Dashboard maximum open connections
+dashr = None            # Dashboard requests per second by route class and client
+dashf = None            # Flag for starting sampling profiles from the dashboard (POST /api/profile)
 log_level = None        # Logging level
 log_max_size = None     # Log file max size in MB
 log_backup_count = None # Number of backup log files
@@ -93,19 +110,32 @@ def start_timelapse_service():
                 print(Fore.YELLOW + Style.BRIGHT + "Running timelapse service without file logging")
                 log_file = None
         
+        # Service writes the name of each finished timelapse to a pipe so the dashboard is updated without polling
+        notify_read, notify_write = os.pipe()
+
         # Start timelapse service as background process with logging
-        if log_file:
-            with open(log_file, 'a') as log:  # Use append mode
+        try:
+            if log_file:
+                with open(log_file, 'a') as log:  # Use append mode
+                    timelapse_process = subprocess.Popen([
+                        "python3", timelapse_script,
+                        "--received", output,
+                        "--notify-fd", str(notify_write)
+                    ], stdout=log, stderr=subprocess.STDOUT, pass_fds=(notify_write,))
+            else:
+                # Run without file logging if permissions don't allow it
                 timelapse_process = subprocess.Popen([
                     "python3", timelapse_script,
-                    "--received", output
-                ], stdout=log, stderr=subprocess.STDOUT)
-        else:
-            # Run without file logging if permissions don't allow it
-            timelapse_process = subprocess.Popen([
-                "python3", timelapse_script,
-                "--received", output
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    "--received", output,
+                    "--notify-fd", str(notify_write)
+                ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, pass_fds=(notify_write,))
+        except Exception:
+            os.close(notify_read)
+            raise
+        finally:
+            os.close(notify_write)
+        
+        Thread(target=watch_timelapses, args=(notify_read,), name="TIMELAPSE WATCH", daemon=True).start()
         
         print(Fore.GREEN + Style.BRIGHT + f"TIMELAPSE SERVICE STARTED (PID: {timelapse_process.pid})")
         if log_file:
@@ -117,6 +147,18 @@ def start_timelapse_service():
         print(Fore.YELLOW + Style.BRIGHT + f"TIMELAPSE SERVICE FAILED TO START: {e}")
 
 
+def watch_timelapses(fd):
+    """
+    Push timelapse list to dashboard event streams whenever the timelapse service finishes a timelapse
+    """
+
+    with os.fdopen(fd, "r") as notify:
+        # Blocks until a timelapse is finished, ends when the service exits
+        for _ in notify:
+            if dash is not None:
+                dash.publish_timelapses()
+
+
 def setup_log_cleanup(logs_dir):
     """
     Setup log cleanup to prevent logs from growing indefinitely
@@ -246,11 +288,16 @@ def init():
     dirs()
     config_input()
 
+    # Start a sampling profile on SIGUSR1 (e.g. "kill -USR1 <pid>"), written to the profiles folder in the output path
+    profiler.configure(path.join(output, "profiles"))
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.start())
+
     # Load decryption keys
     load_keys()
 
     # Create demuxer instance
-    demux_config = namedtuple('demux_config', 'spacecraft downlink verbose dump output images xrit blacklist keys')
+    demux_config = namedtuple('demux_config', 'spacecraft downlink verbose dump output images xrit blacklist keys pyramid depth encoders checkpoint product_timeout product_memory archive trace_log')
     output_full_path = path.join(output, downlink)
     demux = Demuxer(
         demux_config(
@@ -262,13 +309,21 @@ def init():
             output_images,
             output_xrit,
             blacklist,
-            keys
+            keys,
+            output_pyramid,
+            output_depth,
+            output_encoders,
+            output_checkpoint,
+            product_timeout,
+            product_memory,
+            output_archive,
+            output_trace_log
         )
     )
 
     # Start dashboard server
     if dashe:
-        dash_config = namedtuple('dash_config', 'port interval spacecraft downlink output images xrit blacklist version')
+        dash_config = namedtuple('dash_config', 'port interval spacecraft downlink output images xrit blacklist version threads resize_cache connections rate_limits profiling')
         dash = Dashboard(
             dash_config(
                 dashp,
@@ -279,7 +334,12 @@ def init():
                 output_images,
                 output_xrit,
                 blacklist,
-                ver
+                ver,
+                dasht,
+                dashc,
+                dashm,
+                dashr,
+                dashf
             ),
             demux
         )
@@ -395,6 +455,9 @@ def loop():
             else:
                 # Demuxer has all VCDUs from file, wait for processing
                 if demux.complete():
+                    # Save any products still being assembled
+                    demux.flush()
+
                     runTime = round(time() - stime, 3)
                     print("\nFINISHED PROCESSING FILE ({}s)".format(runTime))
                     safe_stop()
@@ -599,11 +662,24 @@ def parse_config(path):
     global output
     global output_images
     global output_xrit
+    global output_pyramid
+    global output_depth
+    global output_encoders
+    global output_checkpoint
+    global product_timeout
+    global product_memory
+    global output_archive
+    global output_trace_log
     global blacklist
     global keypath
     global dashe
     global dashp
     global dashi
+    global dasht
+    global dashc
+    global dashm
+    global dashr
+    global dashf
     global log_level
     global log_max_size
     global log_backup_count
@@ -627,6 +703,80 @@ def parse_config(path):
         dashe = cfgp.getboolean('dashboard', 'enabled')
         dashp = cfgp.get('dashboard', 'port')
         dashi = round((float(cfgp.get('dashboard', 'interval'))), 1)
+
+        # Parse optional dashboard settings with defaults
+        try:
+            dasht = max(1, int(cfgp.get('dashboard', 'threads')))
+        except (NoSectionError, NoOptionError):
+            dasht = 64
+        
+        try:
+            dashc = max(0, int(cfgp.get('dashboard', 'resize_cache_mb'))) * 1024 * 1024
+        except (NoSectionError, NoOptionError):
+            dashc = 64 * 1024 * 1024
+        
+        try:
+            dashm = max(dasht, int(cfgp.get('dashboard', 'max_connections')))
+        except (NoSectionError, NoOptionError):
+            dashm = max(dasht, 256)
+        
+        dashr = {}
+        for route_class, rate in ratelimit.DEFAULT_RATES.items():
+            try:
+                dashr[route_class] = max(0, float(cfgp.get('dashboard', 'rate_limit_' + route_class)))
+            except (NoSectionError, NoOptionError):
+                dashr[route_class] = rate
+
+        try:
+            dashf = cfgp.getboolean('dashboard', 'profiling')
+        except (NoSectionError, NoOptionError):
+            dashf = False
+
+        # Parse optional output settings with defaults
+        try:
+            output_pyramid = cfgp.getboolean('output', 'pyramid')
+        except (NoSectionError, NoOptionError):
+            output_pyramid = True
+
+        try:
+            output_depth = int(cfgp.get('output', 'bit_depth'))
+        except (NoSectionError, NoOptionError):
+            output_depth = 8
+        except ValueError:
+            output_depth = None
+
+        try:
+            output_encoders = encoders.parse(cfgp.get('output', 'encoders'))
+        except (NoSectionError, NoOptionError):
+            output_encoders = (encoders.DEFAULT,)
+        except ValueError as e:
+            print(Fore.YELLOW + Style.BRIGHT + f"Warning: {e}, using \"{encoders.DEFAULT}\"")
+            output_encoders = (encoders.DEFAULT,)
+
+        try:
+            output_checkpoint = cfgp.getboolean('output', 'checkpoint')
+        except (NoSectionError, NoOptionError):
+            output_checkpoint = True
+        
+        try:
+            product_timeout = int(cfgp.get('output', 'product_timeout'))
+        except (NoSectionError, NoOptionError):
+            product_timeout = 120
+        
+        try:
+            product_memory = int(cfgp.get('output', 'product_memory_mb'))
+        except (NoSectionError, NoOptionError):
+            product_memory = 512
+        
+        try:
+            output_archive = cfgp.getboolean('output', 'archive')
+        except (NoSectionError, NoOptionError):
+            output_archive = True
+        
+        try:
+            output_trace_log = cfgp.getboolean('output', 'trace_log')
+        except (NoSectionError, NoOptionError):
+            output_trace_log = True
         
         # Parse logging config with defaults
         try:
@@ -656,6 +806,11 @@ def parse_config(path):
         print(Fore.WHITE + Back.RED + Style.BRIGHT + "ERROR: Invalid dashboard port - " + str(e))
         safe_stop()
 
+    # Validate image bit depth
+    if output_depth not in (8, 16):
+        print(Fore.YELLOW + Style.BRIGHT + f"Warning: Unsupported bit_depth '{output_depth}', using 8-bit images")
+        output_depth = 8
+
     # Limit dashboard refresh interval
     if dashi < 1:
         dashi = 1